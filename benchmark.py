@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""
+Benchmark the crash and grants pipelines against local stand-ins.
+Serves synthetic ArcGIS FeatureServer query responses and Grants.gov
+GrantsDBExtract zips from a local HTTP server, runs each pipeline stage in a
+fresh process, and reports wall time, throughput, peak RSS and bytes
+transferred per stage at several dataset scales.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --scales county region --latency 0.1 --output bench.json
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+from xml.sax.saxutils import escape
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Dataset scales: crash records matching the county query, and opportunities in the grants extract
+SCALES = {
+    'county': {'crashes': 25_000, 'grants': 10_000},
+    'region': {'crashes': 100_000, 'grants': 40_000},
+    'statewide': {'crashes': 500_000, 'grants': 80_000},
+}
+
+# Seconds the stand-in waits before answering each request
+DEFAULT_LATENCY = 0.05
+
+# Synthetic records cycle through this many distinct template records
+TEMPLATE_SIZE = 200
+RANDOM_SEED = 2024
+
+# Stand-in URL layout
+FEATURE_LAYER_PATH = "/arcgis/rest/services/CrashData/FeatureServer/0"
+GRANTS_EXTRACT_PATH = "/extracts/GrantsDBExtract{date}v2.zip"
+GRANTS_NAMESPACE = "http://apply.grants.gov/system/OpportunityDetail-V1.0"
+
+# Synthetic crash dates span this many years back from the start of the current year
+CRASH_YEARS = 6
+
+# Case-insensitive LIKE conditions in a pushed-down WHERE clause: UPPER(field) LIKE 'pattern'
+LIKE_CONDITION = re.compile(r"UPPER\((\w+)\) LIKE '((?:[^']|'')*)'")
+
+# Template values for synthetic crashes
+CRASH_ROUTES = [
+    'S-VA043PR PARHAM RD', 'S-VA043NP BROAD ST', 'S-VA043PR STAPLES MILL RD', 'S-VA043NP NINE MILE RD',
+    'R-VA US00250WB', 'R-VA IS00064EB', 'R-VA SR00006EB', 'R-VA BUS00033', None,
+]
+CRASH_SYSTEMS = ['NonVDOT secondary', 'NonVDOT secondary', 'NonVDOT primary', 'VDOT Primary', 'VDOT Interstate']
+COLLISION_TYPES = ['1. Rear End', '2. Angle', '3. Head On', '4. Sideswipe - Same Direction', '9. Fixed Object - Off Road']
+WEATHER_CONDITIONS = ['1. No Adverse Condition', '5. Rain', '3. Fog', '6. Snow']
+LIGHT_CONDITIONS = ['2. Daylight', '4. Darkness - Road Lighted', '5. Darkness - Road Not Lighted', '1. Dawn']
+FUNCTIONAL_CLASSES = ['LOCAL', 'MINOR COLLECTOR', 'MAJOR COLLECTOR', 'MINOR ARTERIAL', 'PRINCIPAL ARTERIAL - OTHER']
+FACILITY_TYPES = ['2-Way Undivided', '2-Way Divided', '4-Way Divided', '1-Way Undivided']
+CRASH_FLAGS = ['ALCOHOL_NOTALCOHOL', 'PED_NONPED', 'SPEED_NOTSPEED', 'DISTRACTED_NOTDISTRACTED', 'NIGHT',
+               'BIKE_NONBIKE', 'YOUNG_NOTYOUNG', 'SENIOR_NOTSENIOR']
+
+# Template values for synthetic grants; a few opportunities match the safety filters
+GRANT_AGENCIES = ['National Institutes of Health', 'Department of Agriculture', 'National Science Foundation',
+                  'Department of Energy', 'Department of Transportation', 'DOT-FHWA']
+GRANT_CFDA_NUMBERS = ['93.123', '10.001', '47.041', '81.049', '20.600', '20.205', '20.616;20.933']
+GRANT_TOPICS = ['biomedical research', 'rural development', 'science education', 'energy efficiency',
+                'traffic safety', 'pedestrian safety and Vision Zero', 'highway safety improvement']
+LOREM = ("Applicants should describe program goals, expected outcomes, partnerships, evaluation "
+         "plans and the populations served by the proposed activities. ")
+
+# Stages run for every scale, in order: (name, description)
+STAGES = [
+    ('arcgis download', "download_from_arcgis() with an empty HTTP cache"),
+    ('arcgis revalidate', "download_from_arcgis() again, revalidating the cached pages"),
+    ('crash filters', "filter_henrico_county/filter_exclude_state_routes/filter_nonvdot_system "
+                      "on every county record, as downloaded without pushdown"),
+    ('crash pipeline', "download_crash_data.main() end to end with an empty cache (records: crashes written)"),
+    ('grants download', "find_grants_extract() with an empty HTTP cache"),
+    ('grants parse', "download_grants_extract(), parsing every opportunity"),
+    ('grants filter', "filter_grants_extract() on the cached extract"),
+    ('grants pipeline', "download_grants_data.main() end to end with an empty cache (records: grants written)"),
+]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def crash_template(size: int = TEMPLATE_SIZE, seed: int = RANDOM_SEED) -> list:
+    """Distinct synthetic crash attributes, using the ArcGIS layer's field names."""
+    rng = random.Random(seed)
+    template = []
+    for _ in range(size):
+        severity = rng.choices('KABCO', weights=[1, 4, 12, 20, 63])[0]
+        record = {
+            'OBJECTID': None,
+            'DOCUMENT_NBR': None,
+            'CRASH_YEAR': None,
+            'CRASH_DT': None,
+            'CRASH_SEVERITY': severity,
+            'CRASH_MILITARY_TM': rng.randint(0, 2359),
+            'Juris_Code': '43',
+            'Physical_Juris_Name': '043. Henrico County',
+            'RTE_NM': rng.choice(CRASH_ROUTES),
+            'SYSTEM': rng.choice(CRASH_SYSTEMS),
+            'COLLISION_TYPE': rng.choice(COLLISION_TYPES),
+            'WEATHER_CONDITION': rng.choice(WEATHER_CONDITIONS),
+            'LIGHT_CONDITION': rng.choice(LIGHT_CONDITIONS),
+            'K_PEOPLE': int(severity == 'K'),
+            'A_PEOPLE': int(severity == 'A'),
+            'B_PEOPLE': int(severity == 'B'),
+            'C_PEOPLE': int(severity == 'C'),
+            'VEH_COUNT': rng.randint(1, 4),
+            'FUN': rng.choice(FUNCTIONAL_CLASSES),
+            'FAC': rng.choice(FACILITY_TYPES),
+            'AREA_TYPE': rng.choice(['Urban', 'Rural']),
+            'NODE': rng.randint(1, 2000) if rng.random() < 0.6 else None,
+            'OFFSET': round(rng.uniform(0, 500), 1),
+            'RNS_MP': round(rng.uniform(0, 12), 2),
+        }
+        for flag in CRASH_FLAGS:
+            record[flag] = 'Yes' if rng.random() < 0.1 else 'No'
+        template.append(record)
+    return template
+
+
+def crash_time_span() -> tuple:
+    """Start (epoch ms) and length (hours) of the synthetic crash dates."""
+    start = datetime(datetime.now().year - CRASH_YEARS, 1, 1)
+    return int(start.timestamp() * 1000), CRASH_YEARS * 365 * 24
+
+
+def crash_feature(template: list, i: int, out_fields: list, start_ms: int, span_hours: int) -> dict:
+    """The i-th synthetic crash as an ArcGIS feature (deterministic for a given i)."""
+    cycle, slot = divmod(i, len(template))
+    record = dict(template[slot])
+    crash_ms = start_ms + (i * 7919 % span_hours) * 3600 * 1000
+    record['OBJECTID'] = i + 1
+    record['DOCUMENT_NBR'] = str(200000000 + i)
+    record['CRASH_DT'] = crash_ms
+    record['CRASH_YEAR'] = datetime.fromtimestamp(crash_ms / 1000, timezone.utc).year
+    if record['NODE'] is not None:
+        record['NODE'] += 2000 * (cycle % 25)
+    record['RNS_MP'] = round((record['RNS_MP'] + cycle * 0.37) % 12, 2)
+    if out_fields:
+        record = {field: record.get(field) for field in out_fields}
+
+    geometry = {
+        'x': round(-77.65 + (i * 7919 % 10007) / 10007 * 0.45, 6),
+        'y': round(37.42 + (i * 104729 % 10009) / 10009 * 0.33, 6),
+    }
+    return {'attributes': record, 'geometry': geometry}
+
+
+def write_grants_extract(path: str, count: int, extract_date: str, seed: int = RANDOM_SEED) -> None:
+    """Write a synthetic GrantsDBExtract zip holding one XML file of `count` opportunities."""
+    rng = random.Random(seed)
+    today = datetime.now()
+    template = []
+    for _ in range(TEMPLATE_SIZE):
+        relevant = rng.random() < 0.05
+        topic = rng.choice(GRANT_TOPICS[4:] if relevant else GRANT_TOPICS[:4])
+        close_date = today + timedelta(days=rng.randint(-365, 365))
+        template.append({
+            'agency': rng.choice(GRANT_AGENCIES[4:] if relevant else GRANT_AGENCIES[:4]),
+            'cfda': rng.choice(GRANT_CFDA_NUMBERS[4:] if relevant else GRANT_CFDA_NUMBERS[:4]),
+            'topic': topic,
+            'close_date': close_date.strftime('%m%d%Y'),
+            'description': f"Funding for {topic}. " + LOREM * rng.randint(2, 20),
+            'ceiling': rng.randint(1, 200) * 10000,
+        })
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(f"GrantsDBExtract{extract_date}v2.xml", 'w') as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<Grants xmlns="{GRANTS_NAMESPACE}">\n'.encode())
+            for i in range(count):
+                grant = template[i % len(template)]
+                f.write((
+                    f"<OpportunitySynopsisDetail_1_0>"
+                    f"<OpportunityID>{300000 + i}</OpportunityID>"
+                    f"<OpportunityTitle>{escape(grant['topic'].capitalize())} program {i}</OpportunityTitle>"
+                    f"<OpportunityNumber>BENCH-{i:06d}</OpportunityNumber>"
+                    f"<AgencyName>{escape(grant['agency'])}</AgencyName>"
+                    f"<CFDANumbers>{grant['cfda']}</CFDANumbers>"
+                    f"<PostDate>01012025</PostDate>"
+                    f"<CloseDate>{grant['close_date']}</CloseDate>"
+                    f"<AwardCeiling>{grant['ceiling']}</AwardCeiling>"
+                    f"<AwardFloor>0</AwardFloor>"
+                    f"<Description>{escape(grant['description'])}</Description>"
+                    f"<AdditionalInformationURL>https://www.grants.gov/search-results-detail/{300000 + i}"
+                    f"</AdditionalInformationURL>"
+                    f"</OpportunitySynopsisDetail_1_0>\n"
+                ).encode())
+            f.write(b"</Grants>\n")
+
+
+# ---------------------------------------------------------------------------
+# Stand-in server
+# ---------------------------------------------------------------------------
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers ArcGIS layer metadata, count and paginated feature queries (as GET
+    or POST form), and Grants.gov extract HEAD/GET requests. Only the extract for
+    `server.extract_date` exists; other dates get 403, as from S3.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b'', content_type: str = 'application/json',
+              headers: dict = None, send_body: bool = True) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+            self.server.count_bytes(len(body))
+
+    def _send_json(self, data) -> None:
+        body = json.dumps(data).encode()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, headers={'ETag': etag})
+        else:
+            self._send(200, body, headers={'ETag': etag})
+
+    def _handle(self, send_body: bool, form: str = '') -> None:
+        time.sleep(self.server.latency)
+        self.server.count_request()
+        url = urlparse(self.path)
+        query = dict(parse_qsl(url.query))
+        query.update(parse_qsl(form))
+
+        if url.path == FEATURE_LAYER_PATH:
+            self._send_json({'fields': [{'name': name} for name in self.server.crash_template[0]]})
+        elif url.path == FEATURE_LAYER_PATH + "/query":
+            self._send_json(self.server.query_features(query))
+        elif url.path == GRANTS_EXTRACT_PATH.format(date=self.server.extract_date):
+            self._send_file(self.server.extract_path, send_body)
+        elif url.path.startswith("/extracts/"):
+            self._send(403, send_body=send_body)
+        else:
+            self._send(404, send_body=send_body)
+
+    def _send_file(self, path: str, send_body: bool) -> None:
+        if self.headers.get('If-None-Match') == self.server.extract_etag:
+            self._send(304, headers={'ETag': self.server.extract_etag})
+            return
+
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(size))
+        self.send_header('ETag', self.server.extract_etag)
+        self.end_headers()
+        if send_body:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile)
+            self.server.count_bytes(size)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_POST(self):
+        form = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self._handle(send_body=True, form=form)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the synthetic datasets and transfer counters."""
+
+    daemon_threads = True
+
+    def __init__(self, crashes: int, extract_path: str, extract_date: str, latency: float, counters):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.crashes = crashes
+        self.latency = latency
+        self.counters = counters
+        self.extract_path = extract_path
+        self.extract_date = extract_date
+        with open(extract_path, 'rb') as f:
+            self.extract_etag = '"' + hashlib.md5(f.read()).hexdigest() + '"'
+
+        self.crash_template = crash_template()
+        self.start_ms, self.span_hours = crash_time_span()
+        # Template slots kept by each WHERE clause seen, evaluated once per clause
+        self._slots = {}
+
+    def count_bytes(self, size: int) -> None:
+        with self.counters['bytes'].get_lock():
+            self.counters['bytes'].value += size
+
+    def count_request(self) -> None:
+        with self.counters['requests'].get_lock():
+            self.counters['requests'].value += 1
+
+    def _selection(self, where: str) -> tuple:
+        """Template slots matching a WHERE clause and the number of matching records."""
+        if where not in self._slots:
+            self._slots[where] = pushdown_slots(self.crash_template, where)
+        slots = self._slots[where]
+        cycles, remainder = divmod(self.crashes, len(self.crash_template))
+        return slots, cycles * len(slots) + sum(1 for slot in slots if slot < remainder)
+
+    def query_features(self, query: dict) -> dict:
+        """Answer a FeatureServer query: a record count, or one page of features."""
+        slots, count = self._selection(query.get('where', '1=1'))
+        if query.get('returnCountOnly') == 'true':
+            return {'count': count}
+
+        offset = int(query.get('resultOffset', 0))
+        limit = int(query.get('resultRecordCount', 2000))
+        out_fields = query.get('outFields', '*')
+        out_fields = None if out_fields == '*' else out_fields.split(',')
+
+        features = []
+        for k in range(offset, min(offset + limit, count)):
+            cycle, pos = divmod(k, len(slots))
+            i = cycle * len(self.crash_template) + slots[pos]
+            features.append(crash_feature(self.crash_template, i, out_fields, self.start_ms, self.span_hours))
+        return {'features': features, 'exceededTransferLimit': offset + limit < count}
+
+
+def _like_regex(pattern: str):
+    """Compile a SQL LIKE pattern ('%' any run, '_' any character) into an anchored regex."""
+    pattern = pattern.replace("''", "'")
+    return re.compile(''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern) + r'\Z',
+                      re.DOTALL)
+
+
+def pushdown_slots(template: list, where: str) -> list:
+    """
+    Template slots kept by the route and system conditions of a WHERE clause.
+    The clause is evaluated here from its own LIKE conditions, independently
+    of the pipeline's filter code: a record is kept when its route is null or
+    matches none of the route patterns and its system matches every system
+    pattern. Clauses without LIKE conditions (the jurisdiction queries) keep
+    every slot.
+    """
+    patterns = {}
+    for field, pattern in LIKE_CONDITION.findall(where):
+        patterns.setdefault(field, []).append(_like_regex(pattern))
+    if not patterns:
+        return list(range(len(template)))
+
+    route_patterns = patterns.get('RTE_NM', [])
+    system_patterns = patterns.get('SYSTEM', [])
+    slots = []
+    for slot, record in enumerate(template):
+        route = record['RTE_NM']
+        system = record['SYSTEM']
+        if route is not None and any(p.match(route.upper()) for p in route_patterns):
+            continue
+        if system_patterns and (system is None or not all(p.match(system.upper()) for p in system_patterns)):
+            continue
+        slots.append(slot)
+    return slots
+
+
+def serve_stand_in(crashes: int, extract_path: str, extract_date: str, latency: float, counters, ready) -> None:
+    """Run the stand-in server until the process is terminated (process entry point)."""
+    server = StandInServer(crashes, extract_path, extract_date, latency, counters)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+# ---------------------------------------------------------------------------
+# Stages (each runs in a fresh process)
+# ---------------------------------------------------------------------------
+
+class Stopwatch:
+    """Accumulates wall time spent inside `with stopwatch:` blocks."""
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed += time.perf_counter() - self._start
+
+
+def _use_cache(config: dict, name: str):
+    """Point the HTTP cache at a directory under the benchmark's work directory."""
+    import http_client
+
+    http_client.CACHE_DIR = os.path.join(config['work_dir'], name)
+    http_client.CACHE_INDEX = os.path.join(http_client.CACHE_DIR, "index.json")
+    http_client.CACHE_BODY_DIR = os.path.join(http_client.CACHE_DIR, "bodies")
+    http_client.FINGERPRINT_FILE = os.path.join(http_client.CACHE_DIR, "fingerprints.json")
+    return http_client
+
+
+def _crash_module(config: dict, output_name: str):
+    """Import download_crash_data pointed at the stand-in and a scratch output directory."""
+    import download_crash_data
+
+    output_dir = os.path.join(config['work_dir'], output_name)
+    os.makedirs(output_dir, exist_ok=True)
+    download_crash_data.PRIMARY_API_URL = config['base_url'] + FEATURE_LAYER_PATH + "/query"
+    download_crash_data.FALLBACK_CSV_URL = config['base_url'] + "/fallback.csv"
+    download_crash_data.RECORDS_PER_REQUEST = config['page_size']
+    download_crash_data.OUTPUT_DIR = output_dir
+    download_crash_data.OUTPUT_FILE = os.path.join(output_dir, "crashes.csv")
+    download_crash_data.PARQUET_DIR = os.path.join(output_dir, "crashes_parquet")
+    download_crash_data.WATERMARK_FILE = os.path.join(output_dir, "crashes_watermark.json")
+    download_crash_data.SPOOL_DIR = os.path.join(output_dir, ".spool")
+    download_crash_data.SPOOL_MANIFEST = os.path.join(download_crash_data.SPOOL_DIR, "manifest.json")
+    return download_crash_data
+
+
+def _grants_module(config: dict, output_name: str):
+    """Import download_grants_data pointed at the stand-in and a scratch output directory."""
+    import download_grants_data
+
+    output_dir = os.path.join(config['work_dir'], output_name)
+    os.makedirs(output_dir, exist_ok=True)
+    download_grants_data.GRANTS_URL_TEMPLATE = config['base_url'] + GRANTS_EXTRACT_PATH
+    download_grants_data.OUTPUT_DIR = output_dir
+    download_grants_data.OUTPUT_FILE = os.path.join(output_dir, "grants.csv")
+    return download_grants_data
+
+
+def stage_arcgis_download(config: dict, stopwatch: Stopwatch) -> int:
+    http_client = _use_cache(config, "cache")
+    crash = _crash_module(config, "arcgis")
+    http_client.configure_session(pool_size=config['workers'] + 1)
+
+    with stopwatch:
+        df = crash.download_from_arcgis(workers=config['workers'])
+    return len(df)
+
+
+def stage_arcgis_revalidate(config: dict, stopwatch: Stopwatch) -> int:
+    http_client = _use_cache(config, "cache")
+    crash = _crash_module(config, "arcgis")
+    http_client.configure_session(pool_size=config['workers'] + 1)
+
+    with stopwatch:
+        df = crash.download_from_arcgis(workers=config['workers'])
+    return len(df)
+
+
+def stage_crash_filters(config: dict, stopwatch: Stopwatch) -> int:
+    import pandas as pd
+
+    crash = _crash_module(config, "arcgis")
+    # Every county record as the stand-in would serve it without pushdown, so the
+    # local filters have state route and VDOT records to remove
+    template = crash_template()
+    start_ms, span_hours = crash_time_span()
+    df = pd.DataFrame([
+        {**feature['attributes'], **feature['geometry']}
+        for feature in (crash_feature(template, i, None, start_ms, span_hours) for i in range(config['crashes']))
+    ])
+
+    with stopwatch:
+        filtered = crash.filter_henrico_county(df)
+        filtered = crash.filter_exclude_state_routes(filtered)
+        filtered = crash.filter_nonvdot_system(filtered)
+    logger.info(f"Crash filters kept {len(filtered)} of {len(df)} records")
+    return len(df)
+
+
+def stage_crash_pipeline(config: dict, stopwatch: Stopwatch) -> int:
+    import pandas as pd
+
+    _use_cache(config, "cache-crash-pipeline")
+    crash = _crash_module(config, "crash-pipeline")
+
+    with stopwatch:
+        crash.main(['--workers', str(config['workers'])])
+    return len(pd.read_csv(crash.OUTPUT_FILE, usecols=['OBJECTID']))
+
+
+def stage_grants_download(config: dict, stopwatch: Stopwatch) -> int:
+    http_client = _use_cache(config, "cache")
+    grants = _grants_module(config, "grants")
+    http_client.configure_session(pool_size=grants.MAX_LOOKBACK_DAYS)
+
+    with stopwatch:
+        response = grants.find_grants_extract()
+    if response is None:
+        raise RuntimeError("grants extract not found on the stand-in")
+    # Opportunities in the downloaded extract, counted outside the timed section
+    return sum(len(chunk) for chunk in grants.iter_grants_extract(response))
+
+
+def stage_grants_parse(config: dict, stopwatch: Stopwatch) -> int:
+    http_client = _use_cache(config, "cache")
+    grants = _grants_module(config, "grants")
+    http_client.configure_session(pool_size=grants.MAX_LOOKBACK_DAYS)
+
+    with stopwatch:
+        df = grants.download_grants_extract()
+    return len(df)
+
+
+def stage_grants_filter(config: dict, stopwatch: Stopwatch) -> int:
+    http_client = _use_cache(config, "cache")
+    grants = _grants_module(config, "grants")
+    http_client.configure_session(pool_size=grants.MAX_LOOKBACK_DAYS)
+
+    with stopwatch:
+        _, total = grants.filter_grants_extract(grants.find_grants_extract())
+    return total
+
+
+def stage_grants_pipeline(config: dict, stopwatch: Stopwatch) -> int:
+    import pandas as pd
+
+    _use_cache(config, "cache-grants-pipeline")
+    grants = _grants_module(config, "grants-pipeline")
+
+    with stopwatch:
+        grants.main()
+    return len(pd.read_csv(grants.OUTPUT_FILE, usecols=['grant_id']))
+
+
+STAGE_FUNCTIONS = {
+    'arcgis download': stage_arcgis_download,
+    'arcgis revalidate': stage_arcgis_revalidate,
+    'crash filters': stage_crash_filters,
+    'crash pipeline': stage_crash_pipeline,
+    'grants download': stage_grants_download,
+    'grants parse': stage_grants_parse,
+    'grants filter': stage_grants_filter,
+    'grants pipeline': stage_grants_pipeline,
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(name: str, config: dict) -> dict:
+    """Run one stage in this (fresh) process and measure it."""
+    if not config['verbose']:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    stopwatch = Stopwatch()
+    try:
+        records = STAGE_FUNCTIONS[name](config, stopwatch)
+    except SystemExit as e:
+        raise RuntimeError(f"stage exited with status {e.code}") from None
+    return {'seconds': stopwatch.elapsed, 'records': records, 'peak_rss_mb': peak_rss_mb()}
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def benchmark_scale(scale: str, sizes: dict, args: argparse.Namespace, context) -> list:
+    """Start a stand-in for one scale, run every stage against it and return the results."""
+    work_dir = tempfile.mkdtemp(prefix=f"bench-{scale}-")
+    extract_date = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+    extract_path = os.path.join(work_dir, "extract.zip")
+    write_grants_extract(extract_path, sizes['grants'], extract_date)
+
+    counters = {'bytes': context.Value('q', 0), 'requests': context.Value('q', 0)}
+    ready = context.Queue()
+    server = context.Process(
+        target=serve_stand_in, daemon=True,
+        args=(sizes['crashes'], extract_path, extract_date, args.latency, counters, ready),
+    )
+    server.start()
+
+    config = {
+        'base_url': f"http://127.0.0.1:{ready.get(timeout=60)}",
+        'work_dir': work_dir,
+        'workers': args.workers,
+        'page_size': args.page_size,
+        'crashes': sizes['crashes'],
+        'verbose': args.verbose,
+    }
+
+    results = []
+    try:
+        for name, _ in STAGES:
+            bytes_before, requests_before = counters['bytes'].value, counters['requests'].value
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_stage, name, config).result()
+            except Exception as e:
+                logger.error(f"[{scale}] {name} failed: {e}")
+                result = {'seconds': None, 'records': None, 'peak_rss_mb': None, 'error': str(e)}
+
+            result.update({
+                'scale': scale,
+                'stage': name,
+                'bytes': counters['bytes'].value - bytes_before,
+                'requests': counters['requests'].value - requests_before,
+            })
+            if result['seconds']:
+                result['records_per_second'] = result['records'] / result['seconds']
+            results.append(result)
+            logger.info(format_result(result))
+    finally:
+        server.terminate()
+        server.join()
+        if args.keep:
+            logger.info(f"Kept work directory {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def format_result(result: dict) -> str:
+    """One line of the results table."""
+    if result.get('error'):
+        return f"{result['scale']:<10} {result['stage']:<18} FAILED: {result['error']}"
+    return (f"{result['scale']:<10} {result['stage']:<18} {result['seconds']:>9.2f}s "
+            f"{result['records']:>9} rec {result.get('records_per_second', 0):>11,.0f} rec/s "
+            f"{result['peak_rss_mb']:>8.0f} MiB {result['bytes'] / 1024 ** 2:>9.1f} MiB sent "
+            f"{result['requests']:>6} req")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    stages = "\n".join(f"  {name:<18} {description}" for name, description in STAGES)
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crash and grants pipelines against local stand-ins.",
+        epilog=f"stages:\n{stages}", formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--scales', nargs='+', choices=list(SCALES), default=list(SCALES),
+        help="dataset scales to run (default: all)"
+    )
+    parser.add_argument(
+        '--latency', type=float, default=DEFAULT_LATENCY,
+        help=f"seconds the stand-in waits before each response (default: {DEFAULT_LATENCY})"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=4,
+        help="concurrent ArcGIS page downloads (default: 4)"
+    )
+    parser.add_argument(
+        '--page-size', type=int, default=2000,
+        help="features per ArcGIS query page (default: 2000)"
+    )
+    parser.add_argument(
+        '--output', help="also write the results as JSON to this file"
+    )
+    parser.add_argument(
+        '--keep', action='store_true',
+        help="keep each scale's work directory (stand-in data, caches and outputs)"
+    )
+    parser.add_argument(
+        '--verbose', action='store_true',
+        help="show the pipelines' own log output"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark for every requested scale and print the results."""
+    args = parse_args(argv)
+    # Stages run in spawned processes so each one's peak RSS is its own
+    context = multiprocessing.get_context('spawn')
+
+    results = []
+    for scale in args.scales:
+        sizes = SCALES[scale]
+        logger.info(f"Benchmarking {scale} scale: {sizes['crashes']} crashes, {sizes['grants']} grants, "
+                    f"{args.latency}s latency")
+        results.extend(benchmark_scale(scale, sizes, args, context))
+
+    print()
+    print(f"{'scale':<10} {'stage':<18} {'wall':>10} {'records':>13} {'throughput':>17} "
+          f"{'peak RSS':>12} {'transferred':>18} {'requests':>10}")
+    for result in results:
+        print(format_result(result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'latency': args.latency, 'workers': args.workers, 'page_size': args.page_size,
+                       'scales': {scale: SCALES[scale] for scale in args.scales}, 'results': results}, f, indent=2)
+        logger.info(f"Results saved to {args.output}")
+
+    return 1 if any(result.get('error') for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
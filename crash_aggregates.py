@@ -0,0 +1,169 @@
+"""
+Precomputed crash aggregates for the dashboard.
+Builds an aggregate cube from the typed crash frame so breakdowns by year,
+severity, collision type, conditions, month, hour and crash flags can be
+rendered without touching the raw crash rows.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Output configuration
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CUBE_FILENAME = "crash_cube.json"
+
+# EPDO (equivalent property damage only) weight of one crash of each KABCO severity
+EPDO_WEIGHTS = {'K': 462, 'A': 62, 'B': 12, 'C': 5, 'O': 1}
+
+# Cube dimensions; month and hour are derived from Crash Date and Crash Military Time
+CUBE_DIMENSIONS = [
+    'year', 'month', 'hour', 'severity', 'collision_type', 'light_condition', 'weather_condition',
+]
+DIMENSION_COLUMNS = {
+    'year': 'Crash Year',
+    'severity': 'Crash Severity',
+    'collision_type': 'Collision Type',
+    'light_condition': 'Light Condition',
+    'weather_condition': 'Weather Condition',
+}
+
+# Cuboids (group-by dimension sets) stored in the cube. Every dashboard breakdown is
+# a year x severity view, so each cuboid's size is bounded by the dimension
+# cardinalities, not by the number of crashes
+CUBE_GROUPS = [
+    ('year', 'severity'),
+    ('year', 'severity', 'month'),
+    ('year', 'severity', 'hour'),
+    ('year', 'severity', 'collision_type'),
+    ('year', 'severity', 'light_condition'),
+    ('year', 'severity', 'weather_condition'),
+    ('year', 'severity', 'collision_type', 'light_condition'),
+]
+
+# Crash flags counted in the 'flag' cuboid (year x severity x flag, Yes crashes only)
+CUBE_FLAGS = [
+    'Pedestrian?', 'Bike?', 'Speed?', 'Alcohol?', 'Distracted?', 'Night?', 'Unrestrained?',
+    'Motorcycle?', 'Young?', 'Senior?', 'Hitrun?', 'Drug Related?',
+]
+
+# People counts summed into every cell alongside the crash count and EPDO
+CUBE_COUNT_COLUMNS = ['K_People', 'A_People', 'B_People', 'C_People']
+
+
+def severity_codes(severity: pd.Series) -> pd.Series:
+    """Normalise KABCO severities to their single-letter codes (e.g. 'K. Fatal Injury' -> 'K')."""
+    return severity.astype('string').str.strip().str[:1].str.upper()
+
+
+def epdo_scores(severity: pd.Series) -> np.ndarray:
+    """EPDO weight of each crash; unknown severities count as property damage only."""
+    return severity_codes(severity).map(EPDO_WEIGHTS).fillna(EPDO_WEIGHTS['O']).to_numpy(dtype=np.int64)
+
+
+def _dimension_values(df: pd.DataFrame, name: str) -> pd.Series:
+    """Derive one cube dimension from the crash frame (missing values stay missing)."""
+    if name == 'month':
+        if 'Crash Date' not in df.columns:
+            return pd.Series(pd.NA, index=df.index)
+        return df['Crash Date'].dt.month.astype('Int16')
+    if name == 'hour':
+        if 'Crash Military Time' not in df.columns:
+            return pd.Series(pd.NA, index=df.index)
+        hours = pd.to_numeric(df['Crash Military Time'], errors='coerce') // 100
+        return hours.where(hours.between(0, 23)).astype('Int16')
+    if name == 'severity' and 'Crash Severity' in df.columns:
+        return severity_codes(df['Crash Severity'])
+
+    column = DIMENSION_COLUMNS[name]
+    if column not in df.columns:
+        return pd.Series(pd.NA, index=df.index)
+    return df[column]
+
+
+def _encode(values: pd.Series) -> tuple:
+    """Dictionary-encode a dimension: (int codes, sorted list of JSON-friendly values; None for missing)."""
+    codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=True)
+    labels = [value.item() if hasattr(value, 'item') else value for value in uniques.tolist()]
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(labels), codes)
+        labels.append(None)
+    return codes.astype(np.int32), labels
+
+
+def _aggregate(keys: dict, measures: dict, mask: np.ndarray = None) -> pd.DataFrame:
+    """Sum the measures over every observed combination of the key columns."""
+    frame = pd.DataFrame({**keys, **measures})
+    if mask is not None:
+        frame = frame[mask]
+    return frame.groupby(list(keys), sort=True).sum().reset_index()
+
+
+def _columns(cells: pd.DataFrame) -> dict:
+    """Store cells column-wise as plain int lists."""
+    return {col: cells[col].astype(int).tolist() for col in cells.columns}
+
+
+def build_crash_cube(df: pd.DataFrame) -> dict:
+    """
+    Aggregate crashes into the CUBE_GROUPS cuboids plus a per-flag cuboid.
+    Each cell holds the crash count, EPDO and K/A/B/C people for one observed
+    combination of dimension values. Dimensions are dictionary-encoded: cells
+    store indexes into `dimensions[name]`, where None stands for missing.
+    """
+    codes = {}
+    dimensions = {}
+    for name in CUBE_DIMENSIONS:
+        codes[name], dimensions[name] = _encode(_dimension_values(df, name))
+
+    severity = df['Crash Severity'] if 'Crash Severity' in df.columns else pd.Series(pd.NA, index=df.index)
+    measures = {'crashes': np.ones(len(df), dtype=np.int64), 'epdo': epdo_scores(severity)}
+    for col in CUBE_COUNT_COLUMNS:
+        if col in df.columns:
+            measures[col] = df[col].fillna(0).to_numpy(dtype=np.int64)
+
+    cuboids = {}
+    for group in CUBE_GROUPS:
+        cells = _aggregate({name: codes[name] for name in group}, measures)
+        cuboids[','.join(group)] = _columns(cells)
+
+    flag_cells = []
+    for i, flag in enumerate(CUBE_FLAGS):
+        if flag not in df.columns:
+            continue
+        cells = _aggregate({'year': codes['year'], 'severity': codes['severity']}, measures,
+                           mask=df[flag].fillna(False).to_numpy(dtype=bool))
+        cells.insert(2, 'flag', i)
+        flag_cells.append(cells)
+    if flag_cells:
+        cuboids['year,severity,flag'] = _columns(pd.concat(flag_cells, ignore_index=True))
+    dimensions['flag'] = CUBE_FLAGS
+
+    return {
+        'rows': len(df),
+        'dimensions': dimensions,
+        'measures': list(measures),
+        'epdo_weights': EPDO_WEIGHTS,
+        'cuboids': cuboids,
+    }
+
+
+def write_crash_cube(df: pd.DataFrame, output_dir: str = None) -> str:
+    """Build the aggregate cube and write it as compact JSON, returning the path."""
+    path = os.path.join(output_dir or OUTPUT_DIR, CUBE_FILENAME)
+    cube = build_crash_cube(df)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cube, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+    cells = sum(len(cuboid['crashes']) for cuboid in cube['cuboids'].values())
+    logger.info(f"Saved aggregate cube of {cube['rows']} crashes in {cells} cells to {path} "
+                f"({os.path.getsize(path) / 1024:.0f} KB)")
+    return path
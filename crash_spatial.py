@@ -0,0 +1,233 @@
+"""
+Spatial index and hotspot grid for crash locations.
+Buckets crash x/y coordinates into a uniform grid so radius queries only
+look at nearby cells, and precomputes per-cell counts and severity-weighted
+density for heatmaps.
+"""
+
+import json
+import logging
+import math
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from crash_aggregates import epdo_scores, severity_codes
+
+logger = logging.getLogger(__name__)
+
+# Output configuration
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SPATIAL_INDEX_FILENAME = "crash_spatial_index.npz"
+HOTSPOTS_FILENAME = "crash_hotspots.json"
+
+# Grid cell edge length in meters
+CELL_SIZE_M = 250.0
+
+# Meters per degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE_LAT = 110540.0
+METERS_PER_DEGREE_LON = 111320.0
+
+# Decimal places kept for coordinates and densities in the hotspot artifact
+COORD_PRECISION = 6
+DENSITY_PRECISION = 2
+
+# Timestamp stamped on every member of the index archive, so rebuilding an
+# unchanged index gives byte-identical output (the earliest date zip allows)
+ARCHIVE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+_spatial_index = None
+
+
+class SpatialGrid:
+    """
+    Uniform grid over crash locations (WGS84 x/y projected to local meters).
+    Points are sorted by cell, so each occupied cell is a contiguous slice of
+    `point_ids` and a radius query only measures points in the cells the
+    radius overlaps.
+    """
+
+    def __init__(self, origin_x: float, origin_y: float, lat0: float, cell_size: float, ncols: int,
+                 cells: np.ndarray, starts: np.ndarray, point_ids: np.ndarray, px: np.ndarray, py: np.ndarray):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.lat0 = lat0
+        self.cell_size = cell_size
+        self.ncols = ncols
+        self.cells = cells
+        self.starts = starts
+        self.point_ids = point_ids
+        self.px = px
+        self.py = py
+        self.lon_scale = METERS_PER_DEGREE_LON * math.cos(math.radians(lat0))
+
+    @classmethod
+    def build(cls, lon: np.ndarray, lat: np.ndarray, point_ids: np.ndarray, cell_size: float = CELL_SIZE_M):
+        """Build the grid from coordinate arrays; points without coordinates are left out."""
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        lon, lat, point_ids = lon[valid], lat[valid], point_ids[valid]
+        if len(lon) == 0:
+            raise ValueError("no crash coordinates to index")
+
+        lat0 = float(np.mean(lat))
+        lon_scale = METERS_PER_DEGREE_LON * math.cos(math.radians(lat0))
+        px = lon * lon_scale
+        py = lat * METERS_PER_DEGREE_LAT
+        origin_x, origin_y = float(px.min()), float(py.min())
+
+        cols = ((px - origin_x) // cell_size).astype(np.int64)
+        rows = ((py - origin_y) // cell_size).astype(np.int64)
+        ncols = int(cols.max()) + 1
+        cell_ids = rows * ncols + cols
+
+        order = np.argsort(cell_ids, kind='stable')
+        cells, starts = np.unique(cell_ids[order], return_index=True)
+        starts = np.append(starts, len(order))
+        return cls(origin_x, origin_y, lat0, cell_size, ncols, cells, starts,
+                   point_ids[order], px[order], py[order])
+
+    def project(self, lon: float, lat: float) -> tuple:
+        """Project a WGS84 point into the grid's meter coordinates."""
+        return lon * self.lon_scale, lat * METERS_PER_DEGREE_LAT
+
+    def cell_slices(self, x: float, y: float, radius: float):
+        """Yield (start, stop) point slices of every occupied cell within radius of a projected point."""
+        col0 = max(int((x - radius - self.origin_x) // self.cell_size), 0)
+        col1 = min(int((x + radius - self.origin_x) // self.cell_size), self.ncols - 1)
+        row0 = max(int((y - radius - self.origin_y) // self.cell_size), 0)
+        row1 = int((y + radius - self.origin_y) // self.cell_size)
+        if col0 > col1 or row1 < row0:
+            return
+
+        for row in range(row0, row1 + 1):
+            lo, hi = np.searchsorted(self.cells, [row * self.ncols + col0, row * self.ncols + col1 + 1])
+            if lo < hi:
+                # Occupied cells in one grid row are adjacent in `cells`, so their points are one slice
+                yield self.starts[lo], self.starts[hi]
+
+    def query_radius(self, lon: float, lat: float, radius_m: float) -> np.ndarray:
+        """Return the ids of every point within radius_m meters of (lon, lat)."""
+        x, y = self.project(lon, lat)
+        found = []
+        for start, stop in self.cell_slices(x, y, radius_m):
+            dx = self.px[start:stop] - x
+            dy = self.py[start:stop] - y
+            found.append(self.point_ids[start:stop][dx * dx + dy * dy <= radius_m * radius_m])
+        return np.concatenate(found) if found else self.point_ids[:0]
+
+    def save(self, path: str) -> None:
+        """
+        Write the grid as a compressed NumPy archive readable by np.load().
+        Written member by member with a fixed timestamp rather than through
+        np.savez_compressed, which stamps the current time into the zip.
+        """
+        arrays = {
+            'params': np.array([self.origin_x, self.origin_y, self.lat0, self.cell_size, self.ncols]),
+            'cells': self.cells, 'starts': self.starts, 'point_ids': self.point_ids, 'px': self.px, 'py': self.py,
+        }
+        tmp_path = path + ".tmp.npz"
+        with zipfile.ZipFile(tmp_path, 'w') as archive:
+            for name, array in arrays.items():
+                info = zipfile.ZipInfo(name + '.npy', date_time=ARCHIVE_DATE_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Load a grid written by save()."""
+        with np.load(path) as data:
+            origin_x, origin_y, lat0, cell_size, ncols = data['params']
+            return cls(float(origin_x), float(origin_y), float(lat0), float(cell_size), int(ncols),
+                       data['cells'], data['starts'], data['point_ids'], data['px'], data['py'])
+
+
+def build_hotspots(grid: SpatialGrid, severity: np.ndarray, point_order: np.ndarray) -> dict:
+    """
+    Summarise every occupied grid cell: crash count, K+A crashes, EPDO, EPDO
+    per square kilometer, and EPDO summed over the cell and its 8 neighbours
+    (the hotspot ranking). `severity` holds KABCO codes aligned with
+    `point_order`, the index of each grid point in the original frame.
+    """
+    cell_of_point = np.repeat(np.arange(len(grid.cells)), np.diff(grid.starts))
+    codes = severity[point_order]
+    crashes = np.bincount(cell_of_point, minlength=len(grid.cells))
+    ka = np.bincount(cell_of_point, weights=np.isin(codes, ['K', 'A']), minlength=len(grid.cells))
+    epdo = np.bincount(cell_of_point, weights=epdo_scores(pd.Series(codes)), minlength=len(grid.cells))
+
+    rows, cols = np.divmod(grid.cells, grid.ncols)
+    smoothed = np.zeros(len(grid.cells))
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            neighbour_cols = cols + dc
+            neighbours = (rows + dr) * grid.ncols + neighbour_cols
+            pos = np.clip(np.searchsorted(grid.cells, neighbours), 0, len(grid.cells) - 1)
+            present = (grid.cells[pos] == neighbours) & (neighbour_cols >= 0) & (neighbour_cols < grid.ncols)
+            smoothed += np.where(present, epdo[pos], 0)
+
+    center_x = grid.origin_x + (cols + 0.5) * grid.cell_size
+    center_y = grid.origin_y + (rows + 0.5) * grid.cell_size
+    lon = center_x / grid.lon_scale
+    lat = center_y / METERS_PER_DEGREE_LAT
+    area_km2 = (grid.cell_size / 1000.0) ** 2
+
+    order = np.lexsort((-crashes, -smoothed))
+    return {
+        'cell_size_m': grid.cell_size,
+        'cells': {
+            'lon': np.round(lon[order], COORD_PRECISION).tolist(),
+            'lat': np.round(lat[order], COORD_PRECISION).tolist(),
+            'crashes': crashes[order].astype(int).tolist(),
+            'ka': ka[order].astype(int).tolist(),
+            'epdo': epdo[order].astype(int).tolist(),
+            'epdo_density': np.round(epdo[order] / area_km2, DENSITY_PRECISION).tolist(),
+            'smoothed_epdo': smoothed[order].astype(int).tolist(),
+        },
+    }
+
+
+def write_spatial_outputs(df: pd.DataFrame, output_dir: str = None) -> str:
+    """Build the spatial grid over crash x/y and write it with the hotspot summary."""
+    output_dir = output_dir or OUTPUT_DIR
+    ids = pd.to_numeric(df['OBJECTID'], errors='coerce') if 'OBJECTID' in df.columns else pd.Series(df.index)
+    # Rows without an OBJECTID are left out like rows without coordinates
+    has_id = ids.notna().to_numpy()
+    lon = np.where(has_id, df['x'].to_numpy(dtype=float, na_value=np.nan), np.nan)
+    lat = np.where(has_id, df['y'].to_numpy(dtype=float, na_value=np.nan), np.nan)
+    point_ids = ids.fillna(-1).to_numpy(dtype=np.int64)
+
+    # Build on row positions first so hotspot severities can be looked up, then store OBJECTIDs
+    grid = SpatialGrid.build(lon, lat, np.arange(len(df)))
+    point_order = grid.point_ids
+    grid.point_ids = point_ids[point_order]
+    grid.save(os.path.join(output_dir, SPATIAL_INDEX_FILENAME))
+
+    severity = severity_codes(df['Crash Severity']).fillna('O').to_numpy(dtype=object) \
+        if 'Crash Severity' in df.columns else np.full(len(df), 'O', dtype=object)
+    hotspots = build_hotspots(grid, severity, point_order)
+    path = os.path.join(output_dir, HOTSPOTS_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(hotspots, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+    logger.info(f"Indexed {len(point_order)} crash locations in {len(grid.cells)} grid cells; "
+                f"saved hotspots to {path}")
+    return path
+
+
+def load_spatial_index(output_dir: str = None) -> SpatialGrid:
+    """Load the crash spatial index (once per process)."""
+    global _spatial_index
+    path = os.path.join(output_dir or OUTPUT_DIR, SPATIAL_INDEX_FILENAME)
+    if _spatial_index is None or _spatial_index[0] != path:
+        _spatial_index = (path, SpatialGrid.load(path))
+    return _spatial_index[1]
+
+
+def crashes_near(lon: float, lat: float, radius_m: float, output_dir: str = None) -> np.ndarray:
+    """Return the OBJECTIDs of crashes within radius_m meters of a point."""
+    return load_spatial_index(output_dir).query_radius(lon, lat, radius_m)
@@ -0,0 +1,182 @@
+"""
+Pre-tiled crash points for the map view.
+Cuts crash x/y into Web Mercator z/x/y tiles: clustered counts at county and
+city zooms, individual points from POINT_ZOOM on. Only tiles whose content
+changed since the last run are rewritten.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from crash_aggregates import epdo_scores, severity_codes
+
+logger = logging.getLogger(__name__)
+
+# Output configuration
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+TILES_DIRNAME = "crash_tiles"
+TILES_MANIFEST = "manifest.json"
+
+# Zoom levels: clusters from MIN_ZOOM up to POINT_ZOOM - 1, raw points at POINT_ZOOM
+# (the map overzooms point tiles beyond it)
+MIN_ZOOM = 8
+POINT_ZOOM = 14
+
+# Clusters are formed on a CLUSTER_BINS x CLUSTER_BINS grid inside each tile
+CLUSTER_BINS = 16
+
+# Decimal places kept for coordinates in tiles
+COORD_PRECISION = 6
+
+
+def tile_coordinates(lon: np.ndarray, lat: np.ndarray, zoom: int) -> tuple:
+    """Project WGS84 points to fractional Web Mercator tile coordinates at a zoom level."""
+    n = 2 ** zoom
+    lat_rad = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    tx = (lon + 180.0) / 360.0 * n
+    ty = (1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n
+    return tx, ty
+
+
+def _round(values) -> list:
+    return np.round(np.asarray(values, dtype=float), COORD_PRECISION).tolist()
+
+
+def cluster_tiles(points: pd.DataFrame, zoom: int) -> dict:
+    """Aggregate points into per-tile clusters: centroid, crash count, K+A and EPDO."""
+    tx, ty = tile_coordinates(points['lon'].to_numpy(), points['lat'].to_numpy(), zoom)
+    bins = pd.DataFrame({
+        'tile_x': tx.astype(np.int64),
+        'tile_y': ty.astype(np.int64),
+        'bin': (ty * CLUSTER_BINS).astype(np.int64) % CLUSTER_BINS * CLUSTER_BINS
+        + (tx * CLUSTER_BINS).astype(np.int64) % CLUSTER_BINS,
+        'lon': points['lon'].to_numpy(),
+        'lat': points['lat'].to_numpy(),
+        'ka': points['ka'].to_numpy(),
+        'epdo': points['epdo'].to_numpy(),
+    })
+    clusters = bins.groupby(['tile_x', 'tile_y', 'bin'], sort=True).agg(
+        count=('lon', 'size'), lon=('lon', 'mean'), lat=('lat', 'mean'), ka=('ka', 'sum'), epdo=('epdo', 'sum'),
+    ).reset_index()
+
+    tiles = {}
+    for (x, y), cells in clusters.groupby(['tile_x', 'tile_y'], sort=True):
+        tiles[(zoom, int(x), int(y))] = {
+            'clusters': {
+                'lon': _round(cells['lon']),
+                'lat': _round(cells['lat']),
+                'count': cells['count'].astype(int).tolist(),
+                'ka': cells['ka'].astype(int).tolist(),
+                'epdo': cells['epdo'].astype(int).tolist(),
+            },
+        }
+    return tiles
+
+
+def point_tiles(points: pd.DataFrame, zoom: int) -> dict:
+    """Split individual points into tiles, sorted by OBJECTID within each tile."""
+    tx, ty = tile_coordinates(points['lon'].to_numpy(), points['lat'].to_numpy(), zoom)
+    points = points.assign(tile_x=tx.astype(np.int64), tile_y=ty.astype(np.int64))
+
+    tiles = {}
+    for (x, y), cells in points.sort_values('id').groupby(['tile_x', 'tile_y'], sort=True):
+        tiles[(zoom, int(x), int(y))] = {
+            'points': {
+                'id': cells['id'].astype(int).tolist(),
+                'lon': _round(cells['lon']),
+                'lat': _round(cells['lat']),
+                'severity': cells['severity'].tolist(),
+            },
+        }
+    return tiles
+
+
+def build_tiles(df: pd.DataFrame) -> dict:
+    """Build every tile for the crash frame, keyed by (z, x, y)."""
+    severity = severity_codes(df['Crash Severity']) if 'Crash Severity' in df.columns \
+        else pd.Series(pd.NA, index=df.index, dtype='string')
+    points = pd.DataFrame({
+        'id': pd.to_numeric(df['OBJECTID'], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+              if 'OBJECTID' in df.columns else np.arange(len(df), dtype=float),
+        'lon': df['x'].to_numpy(dtype=float, na_value=np.nan),
+        'lat': df['y'].to_numpy(dtype=float, na_value=np.nan),
+        'severity': severity.fillna('O').to_numpy(dtype=object),
+        'ka': severity.isin(['K', 'A']).to_numpy(dtype=int),
+        'epdo': epdo_scores(severity),
+    })
+    # Crashes without an OBJECTID or coordinates cannot be placed on a tile
+    points = points[np.isfinite(points['id']) & np.isfinite(points['lon']) & np.isfinite(points['lat'])]
+    points['id'] = points['id'].astype(np.int64)
+
+    tiles = {}
+    for zoom in range(MIN_ZOOM, POINT_ZOOM):
+        tiles.update(cluster_tiles(points, zoom))
+    tiles.update(point_tiles(points, POINT_ZOOM))
+    return tiles
+
+
+def _load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f).get('tiles', {})
+    except ValueError:
+        return {}
+
+
+def write_tiles(df: pd.DataFrame, output_dir: str = None) -> str:
+    """
+    Write crash tiles under crash_tiles/{z}/{x}/{y}.json. Tiles are compared
+    with the content hashes in the manifest from the previous run, so only new
+    or changed tiles are written and tiles that no longer have crashes are removed.
+    """
+    tiles_dir = os.path.join(output_dir or OUTPUT_DIR, TILES_DIRNAME)
+    manifest_path = os.path.join(tiles_dir, TILES_MANIFEST)
+    previous = _load_manifest(manifest_path)
+
+    hashes = {}
+    written = 0
+    for (z, x, y), payload in build_tiles(df).items():
+        key = f"{z}/{x}/{y}"
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha1(body).hexdigest()
+        hashes[key] = digest
+
+        path = os.path.join(tiles_dir, str(z), str(x), f"{y}.json")
+        if previous.get(key) == digest and os.path.exists(path):
+            continue
+        # Swap in complete files, so the map never loads a half-written tile
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        written += 1
+
+    removed = 0
+    for key in set(previous) - set(hashes):
+        path = os.path.join(tiles_dir, f"{key}.json")
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+
+    manifest = {
+        'min_zoom': MIN_ZOOM,
+        'point_zoom': POINT_ZOOM,
+        'cluster_bins': CLUSTER_BINS,
+        'tiles': dict(sorted(hashes.items())),
+    }
+    tmp_path = manifest_path + ".tmp"
+    os.makedirs(tiles_dir, exist_ok=True)
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp_path, manifest_path)
+
+    logger.info(f"Crash tiles: {len(hashes)} tiles, {written} written, {removed} removed ({tiles_dir})")
+    return tiles_dir
@@ -4,14 +4,35 @@ Download crash data from Virginia Roads ArcGIS API.
 Filters for Henrico County and excludes state routes.
 """
 
+import argparse
+import json
 import logging
 import os
+import random
+import re
+import shutil
 import sys
-from datetime import datetime
-
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import requests
 
+import crash_aggregates
+import crash_spatial
+import crash_tiles
+import http_client
+import network_screening
+import safety_screening
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -32,13 +53,291 @@ HENRICO_NAME_PATTERNS = ["HENRICO", "043. Henrico County"]
 # State route types to exclude (B=Business, S=State, IS=Interstate, US=US Route)
 STATE_ROUTE_TYPES = ['B', 'S', 'IS', 'US']
 
+# State route exclusion rules: (local regex on the route name, SQL LIKE patterns on the
+# upper-cased route name). Every LIKE pattern only matches names its regex also matches,
+# so pushing the patterns into the ArcGIS query never drops a record we would keep.
+STATE_ROUTE_RULES = {
+    # Interstate routes (I-64, I-95, etc.)
+    'IS': (r'^I-|^R-VA\s*IS', ['I-%', 'R-VAIS%', 'R-VA IS%']),
+    # US routes
+    'US': (r'^R-VA\s*US|US\d+', ['R-VAUS%', 'R-VA US%'] + [f'%US{d}%' for d in range(10)]),
+    # State routes (but keep secondary/county roads starting with S-)
+    'S': (r'^R-VA\s*SR|^R-VA\s*\d', ['R-VASR%', 'R-VA SR%'] + [f'R-VA{d}%' for d in range(10)]
+          + [f'R-VA {d}%' for d in range(10)]),
+    # Business routes
+    'B': (r'^R-VA\s*B|BUSINESS', ['R-VAB%', 'R-VA B%', '%BUSINESS%']),
+}
+
+# ArcGIS field names used when pushing the route and system filters into the query
+ROUTE_FIELD = 'RTE_NM'
+SYSTEM_FIELD = 'SYSTEM'
+
+# Candidate column names checked by the local filters
+JURIS_COLUMNS = ['Juris_Code', 'JURIS_CODE', 'juris_code', 'Juris Code']
+JURIS_NAME_COLUMNS = ['Physical_Juris_Name', 'PHYSICAL_JURIS_NAME', 'Physical Juris Name', 'PHYSICAL_JURIS']
+FIPS_COLUMNS = ['COUNTYFP', 'FIPS', 'County_FIPS', 'countyfp']
+ROUTE_COLUMNS = ['RTE_NM', 'RTE_NAME', 'RTE NAME', 'Rte_Name', 'Route_Name', 'ROUTE_NAME', 'RTE_Name', 'RTE Name']
+SYSTEM_COLUMNS = ['SYSTEM', 'System', 'system']
+
 # Pagination settings
 RECORDS_PER_REQUEST = 2000
 
+# Records fetched to check the filter pushdown clause against the local filters
+PUSHDOWN_PROBE_RECORDS = 200
+
+# Queries whose encoded parameters are longer than this are sent as a POST form,
+# keeping request lines well under the 8 KB limit of common proxies
+MAX_GET_QUERY_LENGTH = 2048
+
+# Decimal places returned for x/y coordinates (6 places is about 0.1 m)
+GEOMETRY_PRECISION = 6
+
+# Number of pages fetched concurrently from the ArcGIS API (1 = sequential)
+DOWNLOAD_WORKERS = 4
+
+# Per-page retry settings (exponential backoff with full jitter)
+PAGE_RETRIES = 4
+PAGE_RETRY_BASE_DELAY = 2.0
+PAGE_RETRY_MAX_DELAY = 60.0
+
+# Only transient failures are retried: timeouts, dropped connections, throttling and
+# server errors, whether reported as an HTTP status or as an ArcGIS error payload code.
+# Query errors (invalid WHERE clause, unknown outFields) fail immediately.
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Pages are requested in a stable order, so concurrent and resumed offset pages
+# neither skip nor repeat records
+PAGE_ORDER_FIELD = 'OBJECTID'
+
+# Downloaded pages are checkpointed here so a failed run can resume. A spool older
+# than SPOOL_MAX_AGE is discarded rather than stitched to pages of a newer snapshot.
+SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".spool", "arcgis")
+SPOOL_MANIFEST = os.path.join(SPOOL_DIR, "manifest.json")
+SPOOL_MAX_AGE = timedelta(hours=12)
+
+# Rows parsed at a time when streaming the statewide fallback CSV
+FALLBACK_CHUNK_ROWS = 50000
+
 # Output configuration
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "crashes.csv")
 
+# Columnar copy of OUTPUT_FILE, partitioned by Crash Year
+PARQUET_DIR = os.path.join(OUTPUT_DIR, "crashes_parquet")
+PARQUET_PARTITION_COLUMN = 'Crash Year'
+# One fixed-name file per partition directory (Crash Year=<year>/part-0.parquet), so an
+# unchanged year keeps the same file from run to run
+PARQUET_PART_FILENAME = "part-0.parquet"
+# Hive directory name for rows without a Crash Year
+PARQUET_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Low-cardinality text columns stored with dictionary encoding in the columnar output
+CATEGORICAL_COLUMNS = [
+    'Crash Severity', 'Collision Type', 'Weather Condition', 'Light Condition',
+    'Roadway Surface Condition', 'Relation To Roadway', 'Roadway Alignment',
+    'Roadway Surface Type', 'Roadway Defect', 'Roadway Description',
+    'Intersection Type', 'Traffic Control Type', 'Traffic Control Status',
+    'Work Zone Related', 'Work Zone Location', 'Work Zone Type', 'School Zone',
+    'First Harmful Event', 'First Harmful Event Loc', 'Physical Juris Name',
+    'Functional Class', 'Facility Type', 'Area Type', 'SYSTEM', 'VSP', 'Ownership',
+    'Planning District', 'MPO Name', 'VDOT District', 'RoadDeparture Type',
+]
+
+# Typed schema for standardized crash data, applied as pages are ingested
+FLAG_COLUMNS = [
+    'Alcohol?', 'Bike?', 'Pedestrian?', 'Speed?', 'Distracted?', 'Drowsy?', 'Hitrun?',
+    'Senior?', 'Young?', 'Night?', 'Unrestrained?', 'Motorcycle?', 'Drug Related?',
+    'Guardrail Related?', 'Lgtruck?', 'Mainline?',
+]
+COUNT_COLUMNS = [
+    'K_People', 'A_People', 'B_People', 'C_People', 'Persons Injured',
+    'Pedestrians Killed', 'Pedestrians Injured', 'Vehicle Count',
+    'Crash Year', 'Crash Military Time',
+]
+FLOAT_COLUMNS = ['x', 'y', 'RNS MP', 'Node Offset (ft)', 'Max Speed Diff']
+DATE_COLUMNS = ['Crash Date']
+
+# Accepted spellings of Y/N flag values (compared upper-cased)
+FLAG_VALUES = {'YES': True, 'Y': True, 'TRUE': True, '1': True, 'NO': False, 'N': False, 'FALSE': False, '0': False}
+
+# Crash dates are calendar dates in Virginia local time
+CRASH_TIMEZONE = 'America/New_York'
+
+# Comprehensive mapping from API column names to the column names index.html expects
+COLUMN_MAPPING = {
+    # Core identifiers
+    'OBJECTID': 'OBJECTID',
+    'DOCUMENT_NBR': 'Document Nbr',
+    'Document_Nbr': 'Document Nbr',
+
+    # Crash timing
+    'CRASH_YEAR': 'Crash Year',
+    'Crash_Year': 'Crash Year',
+    'CRASH_DT': 'Crash Date',
+    'Crash_Date': 'Crash Date',
+    'CRASH_MILITARY_TM': 'Crash Military Time',
+    'Crash_Military_Time': 'Crash Military Time',
+
+    # Severity
+    'CRASH_SEVERITY': 'Crash Severity',
+    'Crash_Severity': 'Crash Severity',
+    'K_PEOPLE': 'K_People',
+    'A_PEOPLE': 'A_People',
+    'B_PEOPLE': 'B_People',
+    'C_PEOPLE': 'C_People',
+
+    # Injury counts
+    'PERSONS_INJURED': 'Persons Injured',
+    'Persons_Injured': 'Persons Injured',
+    'PEDESTRIANS_KILLED': 'Pedestrians Killed',
+    'Pedestrians_Killed': 'Pedestrians Killed',
+    'PEDESTRIANS_INJURED': 'Pedestrians Injured',
+    'Pedestrians_Injured': 'Pedestrians Injured',
+    'VEH_COUNT': 'Vehicle Count',
+    'Vehicle_Count': 'Vehicle Count',
+
+    # Crash characteristics
+    'COLLISION_TYPE': 'Collision Type',
+    'Collision_Type': 'Collision Type',
+    'WEATHER_CONDITION': 'Weather Condition',
+    'Weather_Condition': 'Weather Condition',
+    'LIGHT_CONDITION': 'Light Condition',
+    'Light_Condition': 'Light Condition',
+    'ROADWAY_SURFACE_COND': 'Roadway Surface Condition',
+    'Roadway_Surface_Condition': 'Roadway Surface Condition',
+    'RELATION_TO_ROADWAY': 'Relation To Roadway',
+    'Relation_To_Roadway': 'Relation To Roadway',
+    'ROADWAY_ALIGNMENT': 'Roadway Alignment',
+    'Roadway_Alignment': 'Roadway Alignment',
+    'ROADWAY_SURFACE_TYPE': 'Roadway Surface Type',
+    'Roadway_Surface_Type': 'Roadway Surface Type',
+    'ROADWAY_DEFECT': 'Roadway Defect',
+    'Roadway_Defect': 'Roadway Defect',
+    'ROADWAY_DESCRIPTION': 'Roadway Description',
+    'Roadway_Description': 'Roadway Description',
+
+    # Intersection/control
+    'INTERSECTION_TYPE': 'Intersection Type',
+    'Intersection_Type': 'Intersection Type',
+    'TRAFFIC_CONTROL_TYPE': 'Traffic Control Type',
+    'Traffic_Control_Type': 'Traffic Control Type',
+    'TRFC_CTRL_STATUS_TYPE': 'Traffic Control Status',
+    'Traffic_Control_Status': 'Traffic Control Status',
+
+    # Work zone / school
+    'WORK_ZONE_RELATED': 'Work Zone Related',
+    'Work_Zone_Related': 'Work Zone Related',
+    'WORK_ZONE_LOCATION': 'Work Zone Location',
+    'Work_Zone_Location': 'Work Zone Location',
+    'WORK_ZONE_TYPE': 'Work Zone Type',
+    'Work_Zone_Type': 'Work Zone Type',
+    'SCHOOL_ZONE': 'School Zone',
+    'School_Zone': 'School Zone',
+
+    # First harmful event
+    'FIRST_HARMFUL_EVENT': 'First Harmful Event',
+    'First_Harmful_Event': 'First Harmful Event',
+    'FIRST_HARMFUL_EVENT_LOC': 'First Harmful Event Loc',
+    'First_Harmful_Event_Loc': 'First Harmful Event Loc',
+
+    # Jurisdiction
+    'JURIS_CODE': 'Juris Code',
+    'Juris_Code': 'Juris Code',
+    'PHYSICAL_JURIS': 'Physical Juris Name',
+    'Physical_Juris_Name': 'Physical Juris Name',
+
+    # Road classification
+    'FUN': 'Functional Class',
+    'Functional_Class': 'Functional Class',
+    'FAC': 'Facility Type',
+    'Facility_Type': 'Facility Type',
+    'AREA_TYPE': 'Area Type',
+    'Area_Type': 'Area Type',
+    'SYSTEM': 'SYSTEM',
+    'VSP': 'VSP',
+    'OWNERSHIP': 'Ownership',
+
+    # Planning/admin
+    'PLAN_DISTRICT': 'Planning District',
+    'Planning_District': 'Planning District',
+    'MPO_NAME': 'MPO Name',
+    'MPO_Name': 'MPO Name',
+    'VDOT_DISTRICT': 'VDOT District',
+    'VDOT_District': 'VDOT District',
+
+    # Route/location
+    'RTE_NM': 'RTE Name',
+    'RTE_NAME': 'RTE Name',
+    'RTE_Name': 'RTE Name',
+    'RNS_MP': 'RNS MP',
+    'NODE': 'Node',
+    'OFFSET': 'Node Offset (ft)',
+    'Node_Offset': 'Node Offset (ft)',
+
+    # Coordinates (keep lowercase)
+    'x': 'x',
+    'y': 'y',
+
+    # Boolean flags
+    'ALCOHOL_NOTALCOHOL': 'Alcohol?',
+    'BIKE_NONBIKE': 'Bike?',
+    'PED_NONPED': 'Pedestrian?',
+    'SPEED_NOTSPEED': 'Speed?',
+    'DISTRACTED_NOTDISTRACTED': 'Distracted?',
+    'DROWSY_NOTDROWSY': 'Drowsy?',
+    'HITRUN_NOT_HITRUN': 'Hitrun?',
+    'SENIOR_NOTSENIOR': 'Senior?',
+    'YOUNG_NOTYOUNG': 'Young?',
+    'NIGHT': 'Night?',
+    'BELTED_UNBELTED': 'Unrestrained?',
+    'MOTOR_NONMOTOR': 'Motorcycle?',
+
+    # Additional boolean flags
+    'DRUG_NODRUG': 'Drug Related?',
+    'GR_NOGR': 'Guardrail Related?',
+    'LGTRUCK_NONLGTRUCK': 'Lgtruck?',
+    'MAINLINE_YN': 'Mainline?',
+
+    # Speed and road attributes
+    'SPEED_DIFF_MAX': 'Max Speed Diff',
+    'RD_TYPE': 'RoadDeparture Type',
+}
+
+# Incremental refresh configuration
+# The watermark records the newest OBJECTID / crash date already in OUTPUT_FILE
+WATERMARK_FILE = os.path.join(OUTPUT_DIR, "crashes_watermark.json")
+# Crashes this many days before the newest crash date are re-downloaded to pick up late edits
+REVISION_WINDOW_DAYS = 90
+# Force a full download when the last one is older than this, to catch deletions
+FULL_REFRESH_INTERVAL_DAYS = 30
+
+
+class ArcGISError(Exception):
+    """Error payload returned by the ArcGIS REST API with an HTTP 200 response."""
+
+    def __init__(self, error):
+        super().__init__(f"ArcGIS API error: {error}")
+        self.code = error.get('code') if isinstance(error, dict) else None
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Check whether a failed ArcGIS request is worth retrying."""
+    if isinstance(error, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return getattr(error.response, 'status_code', None) in TRANSIENT_STATUS_CODES
+    if isinstance(error, ArcGISError):
+        return error.code in TRANSIENT_STATUS_CODES
+    # A body cut off mid-transfer does not parse
+    return isinstance(error, json.JSONDecodeError)
+
+
+def arcgis_query(params: dict, timeout=60) -> http_client.CachedResponse:
+    """Query the ArcGIS layer, as a POST form if the parameters are too long for a GET URL."""
+    if len(urlencode(params)) > MAX_GET_QUERY_LENGTH:
+        return http_client.cached_post(PRIMARY_API_URL, data=params, timeout=timeout)
+    return http_client.cached_get(PRIMARY_API_URL, params=params, timeout=timeout)
+
 
 def get_arcgis_record_count(where_clause: str) -> int:
     """Get total record count from ArcGIS API."""
@@ -48,54 +347,318 @@ def get_arcgis_record_count(where_clause: str) -> int:
         'f': 'json'
     }
 
-    response = requests.get(PRIMARY_API_URL, params=params, timeout=60)
+    response = arcgis_query(params, timeout=60)
     response.raise_for_status()
     data = response.json()
 
     if 'error' in data:
-        raise Exception(f"ArcGIS API error: {data['error']}")
+        raise ArcGISError(data['error'])
 
     return data.get('count', 0)
 
 
-def download_arcgis_page(where_clause: str, offset: int) -> list:
+def get_arcgis_layer_fields() -> list:
+    """Get the field names of the ArcGIS feature layer."""
+    layer_url = PRIMARY_API_URL.rsplit('/query', 1)[0]
+
+    response = http_client.cached_get(layer_url, params={'f': 'json'}, timeout=60)
+    response.raise_for_status()
+    data = response.json()
+
+    if 'error' in data:
+        raise ArcGISError(data['error'])
+
+    return [field['name'] for field in data.get('fields', [])]
+
+
+def resolve_out_fields() -> str:
+    """
+    Build the outFields projection: every layer field that standardize_columns
+    keeps or the local filters read. Falls back to all fields if the layer
+    metadata is unavailable.
+    """
+    wanted = set(COLUMN_MAPPING) | set(JURIS_COLUMNS + JURIS_NAME_COLUMNS + FIPS_COLUMNS + ROUTE_COLUMNS + SYSTEM_COLUMNS)
+
+    try:
+        layer_fields = get_arcgis_layer_fields()
+    except Exception as e:
+        logger.warning(f"Could not read layer fields, requesting all fields: {e}")
+        return '*'
+
+    out_fields = [field for field in layer_fields if field in wanted]
+    if not out_fields:
+        logger.warning("No known fields found in layer, requesting all fields")
+        return '*'
+
+    logger.info(f"Requesting {len(out_fields)} of {len(layer_fields)} layer fields")
+    return ','.join(out_fields)
+
+
+def download_arcgis_page(where_clause: str, offset: int, out_fields: str = '*',
+                         record_count: int = RECORDS_PER_REQUEST) -> list:
     """Download a page of records from ArcGIS API."""
     params = {
         'where': where_clause,
-        'outFields': '*',
+        'outFields': out_fields,
         'returnGeometry': 'true',
+        'returnZ': 'false',
+        'returnM': 'false',
+        'geometryPrecision': GEOMETRY_PRECISION,
         'outSR': '4326',
+        'orderByFields': PAGE_ORDER_FIELD,
         'resultOffset': offset,
-        'resultRecordCount': RECORDS_PER_REQUEST,
+        'resultRecordCount': record_count,
         'f': 'json'
     }
 
-    response = requests.get(PRIMARY_API_URL, params=params, timeout=120)
+    response = arcgis_query(params, timeout=120)
     response.raise_for_status()
     data = response.json()
 
     if 'error' in data:
-        raise Exception(f"ArcGIS API error: {data['error']}")
+        raise ArcGISError(data['error'])
 
     features = data.get('features', [])
     records = []
     for feature in features:
         record = feature.get('attributes', {})
-        # Extract geometry coordinates
-        if 'geometry' in feature and feature['geometry']:
-            record['x'] = feature['geometry'].get('x')
-            record['y'] = feature['geometry'].get('y')
+        # Extract geometry coordinates (always present so every page has the same columns)
+        geometry = feature.get('geometry') or {}
+        record['x'] = geometry.get('x')
+        record['y'] = geometry.get('y')
         records.append(record)
     return records
 
 
-def download_from_arcgis() -> pd.DataFrame:
+def download_arcgis_page_with_retry(where_clause: str, offset: int, out_fields: str = '*',
+                                    retries: int = PAGE_RETRIES, record_count: int = RECORDS_PER_REQUEST) -> list:
     """
-    Download crash data from ArcGIS REST API with pagination.
-    Filters for Henrico County.
+    Download a page of records, retrying transient failures with exponential
+    backoff and jitter. Other errors, such as a rejected query, are raised at once.
     """
-    logger.info("Attempting download from ArcGIS REST API...")
+    for attempt in range(retries + 1):
+        try:
+            return download_arcgis_page(where_clause, offset, out_fields, record_count)
+        except Exception as e:
+            if attempt == retries or not is_transient_error(e):
+                raise
+            delay = random.uniform(0, min(PAGE_RETRY_MAX_DELAY, PAGE_RETRY_BASE_DELAY * 2 ** attempt))
+            logger.warning(f"Page at offset {offset} failed ({e}), retrying in {delay:.1f}s "
+                           f"(attempt {attempt + 1}/{retries})")
+            time.sleep(delay)
+
+
+_spool_lock = threading.Lock()
+
+
+def open_spool(where_clause: str, count: int, out_fields: str = '*') -> dict:
+    """
+    Open the page spool for a download, returning its manifest.
+    A spool left by an earlier run of the same query, page order and record
+    count is reused if it is younger than SPOOL_MAX_AGE; anything else is discarded.
+    """
+    manifest = None
+    if os.path.exists(SPOOL_MANIFEST):
+        try:
+            with open(SPOOL_MANIFEST) as f:
+                manifest = json.load(f)
+        except ValueError as e:
+            logger.warning(f"Discarding unreadable spool manifest: {e}")
+
+    query = {'where_clause': where_clause, 'out_fields': out_fields, 'count': count,
+             'records_per_request': RECORDS_PER_REQUEST, 'order_by': PAGE_ORDER_FIELD}
+    if manifest is not None and manifest.get('query') == query:
+        try:
+            age = datetime.now() - datetime.fromisoformat(manifest['created_at'])
+        except (KeyError, TypeError, ValueError):
+            age = None
+        if age is not None and timedelta(0) <= age <= SPOOL_MAX_AGE:
+            if manifest['pages']:
+                logger.info(f"Resuming download, {len(manifest['pages'])} page(s) already in {SPOOL_DIR}")
+            return manifest
+        logger.info(f"Discarding spooled pages older than {SPOOL_MAX_AGE}")
+
+    clear_spool()
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    manifest = {'query': query, 'created_at': datetime.now().isoformat(), 'pages': {}}
+    _write_spool_manifest(manifest)
+    return manifest
+
+
+def _write_spool_manifest(manifest: dict) -> None:
+    """Atomically write the spool manifest."""
+    tmp_path = SPOOL_MANIFEST + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, SPOOL_MANIFEST)
+
+
+def clear_spool() -> None:
+    """Remove all checkpointed pages."""
+    if not os.path.isdir(SPOOL_DIR):
+        return
+    for filename in os.listdir(SPOOL_DIR):
+        os.remove(os.path.join(SPOOL_DIR, filename))
+
+
+def fetch_spooled_page(manifest: dict, where_clause: str, offset: int, out_fields: str = '*') -> list:
+    """Return a page from the spool if present, otherwise download and checkpoint it."""
+    filename = manifest['pages'].get(str(offset))
+    if filename is not None:
+        with open(os.path.join(SPOOL_DIR, filename)) as f:
+            return json.load(f)
+
+    records = download_arcgis_page_with_retry(where_clause, offset, out_fields)
+
+    filename = f"page_{offset:08d}_{offset + RECORDS_PER_REQUEST:08d}.json"
+    tmp_path = os.path.join(SPOOL_DIR, filename + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(records, f)
+    os.replace(tmp_path, os.path.join(SPOOL_DIR, filename))
+
+    with _spool_lock:
+        manifest['pages'][str(offset)] = filename
+        _write_spool_manifest(manifest)
+
+    return records
+
+
+def iter_arcgis_pages(where_clause: str, count: int, workers: int = DOWNLOAD_WORKERS, out_fields: str = '*'):
+    """
+    Yield (offset, records) pages from ArcGIS API in offset order.
+    Up to `workers` pages are in flight at once, so memory stays bounded
+    to a few pages regardless of the total record count. Pages are
+    checkpointed to SPOOL_DIR and reused if the same query is rerun.
+    """
+    manifest = open_spool(where_clause, count, out_fields)
+    offsets = iter(range(0, count, RECORDS_PER_REQUEST))
+
+    if workers <= 1:
+        for offset in offsets:
+            yield offset, fetch_spooled_page(manifest, where_clause, offset, out_fields)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        # Prime the window, then submit one new page for every page consumed
+        for offset in offsets:
+            pending.append((offset, executor.submit(fetch_spooled_page, manifest, where_clause, offset, out_fields)))
+            if len(pending) >= workers:
+                break
+
+        while pending:
+            offset, future = pending.popleft()
+            records = future.result()
+
+            next_offset = next(offsets, None)
+            if next_offset is not None:
+                pending.append((next_offset, executor.submit(fetch_spooled_page, manifest, where_clause, next_offset, out_fields)))
+
+            yield offset, records
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def compile_pushdown_clause() -> str:
+    """Compile the state route and NonVDOT filters into an ArcGIS WHERE clause."""
+    route_patterns = [p for route_type in STATE_ROUTE_TYPES for p in STATE_ROUTE_RULES[route_type][1]]
+    route_likes = " OR ".join(f"UPPER({ROUTE_FIELD}) LIKE '{p}'" for p in route_patterns)
+
+    # NULL route names are kept locally, so they must be kept server-side too
+    return (
+        f"({ROUTE_FIELD} IS NULL OR NOT ({route_likes})) "
+        f"AND UPPER({SYSTEM_FIELD}) LIKE '%NONVDOT%'"
+    )
+
+
+def _like_to_regex(pattern: str) -> str:
+    """Translate a SQL LIKE pattern into an anchored regular expression."""
+    return '^' + ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern) + '$'
+
+
+def pushdown_mask(df: pd.DataFrame) -> pd.Series:
+    """
+    Evaluate the compile_pushdown_clause() clause locally on raw API records,
+    mirroring ArcGIS LIKE semantics. Returns None if a required field is missing.
+    """
+    if ROUTE_FIELD not in df.columns or SYSTEM_FIELD not in df.columns:
+        return None
+
+    routes = df[ROUTE_FIELD]
+    upper_routes = routes.astype(str).str.upper()
+    excluded = pd.Series(False, index=df.index)
+    for route_type in STATE_ROUTE_TYPES:
+        for pattern in STATE_ROUTE_RULES[route_type][1]:
+            excluded |= upper_routes.str.match(_like_to_regex(pattern), na=False)
+
+    systems = df[SYSTEM_FIELD]
+    nonvdot = systems.notna() & systems.astype(str).str.upper().str.match(_like_to_regex('%NONVDOT%'), na=False)
+
+    return (routes.isna() | ~excluded) & nonvdot
+
+
+def verify_pushdown(df: pd.DataFrame) -> bool:
+    """
+    Check the pushdown clause against the local filters on a sample of raw records.
+    The clause is safe if it never drops a record the local filters keep; records
+    it keeps but the local filters drop are still removed locally.
+    """
+    server_mask = pushdown_mask(df)
+    route_mask = local_route_mask(df)
+    system_mask = nonvdot_system_mask(df)
+    if server_mask is None or route_mask is None or system_mask is None:
+        logger.warning("Sample is missing route or SYSTEM fields, cannot verify filter pushdown")
+        return False
+
+    local_mask = route_mask & system_mask
+    wrongly_dropped = int((local_mask & ~server_mask).sum())
+    extra_kept = int((server_mask & ~local_mask).sum())
+
+    logger.info(f"Pushdown check on {len(df)} sample records: local filters keep {int(local_mask.sum())}, "
+                f"pushdown keeps {int(server_mask.sum())} ({extra_kept} removed locally)")
+    if wrongly_dropped:
+        logger.warning(f"Pushdown clause would drop {wrongly_dropped} records the local filters keep")
+        return False
+    return True
+
+
+def apply_pushdown(where_clause: str, count: int, out_fields: str = '*') -> tuple:
+    """
+    Add the route and system filters to a WHERE clause if they verify against
+    a small sample of route and system values and the service accepts them;
+    otherwise return it unchanged. Returns the WHERE clause and its record count.
+    """
+    if out_fields == '*':
+        probe_fields = f"{ROUTE_FIELD},{SYSTEM_FIELD}"
+    else:
+        probe_fields = ','.join(field for field in out_fields.split(',') if field in ROUTE_COLUMNS + SYSTEM_COLUMNS)
+    if not probe_fields:
+        logger.warning("Layer has no route or SYSTEM fields, cannot verify filter pushdown")
+        return where_clause, count
 
+    try:
+        sample = pd.DataFrame(download_arcgis_page_with_retry(where_clause, 0, probe_fields,
+                                                              record_count=PUSHDOWN_PROBE_RECORDS))
+        if sample.empty or not verify_pushdown(sample):
+            return where_clause, count
+
+        pushed_clause = f"({where_clause}) AND ({compile_pushdown_clause()})"
+        pushed_count = get_arcgis_record_count(pushed_clause)
+    except Exception as e:
+        logger.warning(f"Filter pushdown failed, filtering locally instead: {e}")
+        return where_clause, count
+
+    logger.info(f"Pushed route and system filters into query, {pushed_count} of {count} records to download")
+    return pushed_clause, pushed_count
+
+
+def resolve_arcgis_query(watermark: dict = None, pushdown: bool = True, out_fields: str = '*') -> tuple:
+    """
+    Find a working WHERE clause for Henrico County and its record count.
+    With pushdown, the state route and NonVDOT filters are evaluated server-side.
+    If a watermark is given, the clause is narrowed to records beyond it.
+    """
     # Build WHERE clause for Henrico County
     # Try multiple filter approaches for robustness
     where_clauses = [
@@ -105,8 +668,6 @@ def download_from_arcgis() -> pd.DataFrame:
     ]
 
     # Try each where clause until one works
-    all_records = []
-
     for where_clause in where_clauses:
         try:
             count = get_arcgis_record_count(where_clause)
@@ -123,71 +684,337 @@ def download_from_arcgis() -> pd.DataFrame:
         count = get_arcgis_record_count(where_clause)
         logger.info(f"Total records in dataset: {count}")
 
-    # Download with pagination
-    offset = 0
-    while offset < count:
-        logger.info(f"Downloading records {offset} to {min(offset + RECORDS_PER_REQUEST, count)}...")
-        records = download_arcgis_page(where_clause, offset)
+    if pushdown:
+        where_clause, count = apply_pushdown(where_clause, count, out_fields)
 
+    if watermark is not None:
+        where_clause = f"({where_clause}) AND ({build_incremental_clause(watermark)})"
+        count = get_arcgis_record_count(where_clause)
+        logger.info(f"Found {count} new or revised records with filter: {where_clause}")
+
+    return where_clause, count
+
+
+def download_arcgis_pages(workers: int = DOWNLOAD_WORKERS, watermark: dict = None, pushdown: bool = True,
+                          project: bool = True) -> int:
+    """
+    Download every page of crash data from ArcGIS REST API into the page
+    spool, returning the number of records; iter_spooled_frames() reads them
+    back. Fetching all pages before any is processed lets the caller compare
+    the upstream responses with the last run first. With a watermark, zero
+    records means nothing changed; otherwise an empty download is an error.
+    With project, only the fields the pipeline uses are requested.
+    """
+    logger.info("Attempting download from ArcGIS REST API...")
+
+    out_fields = resolve_out_fields() if project else '*'
+    where_clause, count = resolve_arcgis_query(watermark, pushdown, out_fields)
+
+    # Download with pagination, several pages at a time
+    logger.info(f"Downloading {count} records with {workers} worker(s)...")
+    total = 0
+    for offset, records in iter_arcgis_pages(where_clause, count, workers, out_fields):
         if not records:
             break
 
-        all_records.extend(records)
-        offset += RECORDS_PER_REQUEST
+        logger.info(f"Downloaded records {offset} to {offset + len(records)} of {count}")
+        total += len(records)
 
-    logger.info(f"Downloaded {len(all_records)} total records from ArcGIS API")
+    logger.info(f"Downloaded {total} total records from ArcGIS API")
 
-    if not all_records:
+    if total == 0 and watermark is None:
+        clear_spool()
         raise Exception("No records returned from ArcGIS API")
+    return total
 
-    return pd.DataFrame(all_records)
 
+def iter_spooled_frames():
+    """Yield the spooled ArcGIS pages as DataFrames in offset order, then clear the spool."""
+    with open(SPOOL_MANIFEST) as f:
+        pages = json.load(f)['pages']
 
-def download_from_fallback() -> pd.DataFrame:
-    """Download crash data from fallback CSV URL."""
+    for offset in sorted(pages, key=int):
+        with open(os.path.join(SPOOL_DIR, pages[offset])) as f:
+            records = json.load(f)
+        if not records:
+            break
+        yield pd.DataFrame(records)
+
+    clear_spool()
+
+
+def iter_arcgis_frames(workers: int = DOWNLOAD_WORKERS, watermark: dict = None, pushdown: bool = True,
+                       project: bool = True):
+    """
+    Download crash data from ArcGIS REST API, yielding one DataFrame per page.
+    See download_arcgis_pages() for the arguments.
+    """
+    download_arcgis_pages(workers, watermark, pushdown, project)
+    yield from iter_spooled_frames()
+
+
+def download_from_arcgis(workers: int = DOWNLOAD_WORKERS, watermark: dict = None, pushdown: bool = True,
+                         project: bool = True) -> pd.DataFrame:
+    """
+    Download crash data from ArcGIS REST API with pagination.
+    Filters for Henrico County.
+    If a watermark is given, only records beyond it are downloaded and an
+    empty DataFrame means nothing changed.
+    """
+    frames = list(iter_arcgis_frames(workers, watermark, pushdown, project))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_watermark() -> dict:
+    """Load the incremental refresh watermark, or None if a full download is needed."""
+    if not os.path.exists(WATERMARK_FILE) or not os.path.exists(OUTPUT_FILE):
+        return None
+
+    try:
+        with open(WATERMARK_FILE) as f:
+            watermark = json.load(f)
+        full_refresh_at = datetime.fromisoformat(watermark['full_refresh_at'])
+        int(watermark['max_objectid'])
+        datetime.fromisoformat(watermark['max_crash_date'])
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring invalid watermark file {WATERMARK_FILE}: {e}")
+        return None
+
+    if datetime.now() - full_refresh_at > timedelta(days=FULL_REFRESH_INTERVAL_DAYS):
+        logger.info(f"Last full download was {full_refresh_at:%Y-%m-%d}, doing a full refresh")
+        return None
+
+    return watermark
+
+
+def save_watermark(df: pd.DataFrame, full_refresh_at: datetime) -> None:
+    """Persist the newest OBJECTID and crash date present in the standardized data."""
+    if 'OBJECTID' not in df.columns or 'Crash Date' not in df.columns:
+        logger.warning("OBJECTID or Crash Date column missing, not saving watermark")
+        return
+
+    crash_dates = _parse_crash_dates(df['Crash Date'])
+    max_objectid = pd.to_numeric(df['OBJECTID'], errors='coerce').max()
+    max_crash_date = crash_dates.max()
+    if pd.isna(max_objectid) or pd.isna(max_crash_date):
+        logger.warning("Could not determine watermark from data, not saving watermark")
+        return
+
+    watermark = {
+        'max_objectid': int(max_objectid),
+        'max_crash_date': max_crash_date.strftime('%Y-%m-%d'),
+        'full_refresh_at': full_refresh_at.isoformat(timespec='seconds'),
+    }
+    with open(WATERMARK_FILE, 'w') as f:
+        json.dump(watermark, f, indent=2)
+    logger.info(f"Saved watermark: OBJECTID > {watermark['max_objectid']}, Crash Date {watermark['max_crash_date']}")
+
+
+def build_incremental_clause(watermark: dict) -> str:
+    """Build a WHERE clause selecting new records plus recently revised ones."""
+    revision_start = datetime.fromisoformat(watermark['max_crash_date']) - timedelta(days=REVISION_WINDOW_DAYS)
+    return (
+        f"OBJECTID > {int(watermark['max_objectid'])} "
+        f"OR CRASH_DT >= timestamp '{revision_start:%Y-%m-%d %H:%M:%S}'"
+    )
+
+
+def merge_incremental(df_new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Upsert new records into the existing output, keyed by Document Nbr.
+    Both sides keep their source values, as written to the CSV output.
+    """
+    df_existing = pd.read_csv(OUTPUT_FILE, dtype={'Document Nbr': str}, low_memory=False)
+
+    if 'Document Nbr' not in df_new.columns or 'Document Nbr' not in df_existing.columns:
+        raise Exception("Document Nbr column missing, cannot merge incremental download")
+
+    new_keys = df_new['Document Nbr'].astype(str)
+    replaced = df_existing['Document Nbr'].isin(new_keys).sum()
+    df = pd.concat([df_existing[~df_existing['Document Nbr'].isin(new_keys)], df_new], ignore_index=True)
+
+    logger.info(f"Merged {len(df_new)} records into {len(df_existing)} existing ({replaced} updated, {len(df_new) - replaced} new)")
+    return df
+
+
+def download_fallback_csv() -> http_client.CachedResponse:
+    """
+    Download the fallback CSV into the HTTP cache, revalidating a cached copy.
+    The statewide file is streamed to disk, so it is never held in memory as a whole.
+    """
     logger.info("Attempting download from fallback CSV URL...")
 
-    response = requests.get(FALLBACK_CSV_URL, timeout=300)
+    response = http_client.cached_get(FALLBACK_CSV_URL, timeout=300)
     response.raise_for_status()
+    if response.from_cache:
+        logger.info("Fallback CSV not modified since last download, using cached copy")
+    return response
 
-    # Save temporarily and read as CSV
-    import io
-    df = pd.read_csv(io.StringIO(response.text))
 
-    logger.info(f"Downloaded {len(df)} records from fallback URL")
-    return df
+def iter_fallback_frames(chunk_rows: int = FALLBACK_CHUNK_ROWS, response: http_client.CachedResponse = None):
+    """
+    Stream crash data from the fallback CSV, yielding DataFrames of up to
+    `chunk_rows` rows. The CSV is downloaded first unless `response` from
+    download_fallback_csv() is given.
+    """
+    if response is None:
+        response = download_fallback_csv()
 
+    total = 0
+    with response.open() as f:
+        for df in pd.read_csv(f, chunksize=chunk_rows, low_memory=False):
+            total += len(df)
+            yield df
 
-def filter_henrico_county(df: pd.DataFrame) -> pd.DataFrame:
-    """Filter dataframe to only include Henrico County records."""
-    original_count = len(df)
+    logger.info(f"Downloaded {total} records from fallback URL")
+
+
+def download_from_fallback() -> pd.DataFrame:
+    """Download crash data from fallback CSV URL."""
+    frames = list(iter_fallback_frames())
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def _find_column(df: pd.DataFrame, candidates: list) -> str:
+    """Return the first candidate column present in the dataframe, or None."""
+    for col in candidates:
+        if col in df.columns:
+            return col
+    return None
 
+
+def _factorize_text(values: pd.Series) -> tuple:
+    """Factorize a column by its string form, returning row codes and the distinct strings."""
+    # Mixed object columns can hold values that are equal but print differently
+    # (43 and 43.0), so those are converted to text before factorizing
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        values = values.astype(str)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return codes, pd.Series(uniques, dtype=object).astype(str)
+
+
+def _map_distinct(values: pd.Series, test) -> np.ndarray:
+    """
+    Evaluate a vectorized string test once per distinct value and broadcast
+    the result back to every row. Crash columns repeat a few thousand values
+    across many rows, so this avoids rescanning the same strings.
+    """
+    codes, uniques = _factorize_text(values)
+    result = np.asarray(test(uniques), dtype=bool)
+    return result[codes]
+
+
+def henrico_county_mask(df: pd.DataFrame) -> pd.Series:
+    """Boolean mask of Henrico County records."""
     # Try multiple filter approaches
-    mask = pd.Series([False] * len(df))
+    mask = np.zeros(len(df), dtype=bool)
 
     # Check various possible column names for jurisdiction
-    juris_columns = ['Juris_Code', 'JURIS_CODE', 'juris_code', 'Juris Code']
-    for col in juris_columns:
-        if col in df.columns:
-            mask |= df[col].astype(str).str.strip() == HENRICO_JURIS_CODE
-            break
+    col = _find_column(df, JURIS_COLUMNS)
+    if col is not None:
+        mask |= _map_distinct(df[col], lambda v: v.str.strip() == HENRICO_JURIS_CODE)
 
     # Check Physical Juris Name
-    name_columns = ['Physical_Juris_Name', 'PHYSICAL_JURIS_NAME', 'Physical Juris Name', 'PHYSICAL_JURIS']
-    for col in name_columns:
-        if col in df.columns:
-            for pattern in HENRICO_NAME_PATTERNS:
-                mask |= df[col].astype(str).str.upper().str.contains(pattern.upper(), na=False)
-            break
+    col = _find_column(df, JURIS_NAME_COLUMNS)
+    if col is not None:
+        name_pattern = '|'.join(pattern.upper() for pattern in HENRICO_NAME_PATTERNS)
+        mask |= _map_distinct(df[col], lambda v: v.str.upper().str.contains(name_pattern, na=False))
 
     # Check FIPS code
-    fips_columns = ['COUNTYFP', 'FIPS', 'County_FIPS', 'countyfp']
-    for col in fips_columns:
-        if col in df.columns:
-            mask |= df[col].astype(str).str.strip() == HENRICO_FIPS
-            break
+    col = _find_column(df, FIPS_COLUMNS)
+    if col is not None:
+        mask |= _map_distinct(df[col], lambda v: v.str.strip() == HENRICO_FIPS)
 
-    df_filtered = df[mask].copy()
+    return pd.Series(mask, index=df.index)
+
+
+def state_route_matches(df: pd.DataFrame) -> dict:
+    """
+    Classify each record's route name against STATE_ROUTE_RULES.
+    Returns {route type: boolean array}, or None if no route name column is present.
+    """
+    route_col = _find_column(df, ROUTE_COLUMNS)
+    if route_col is None:
+        return None
+
+    # Route patterns: R-VA (state primary), I- (Interstate), US (US route)
+    # Keep: S-VA043 (secondary county roads)
+    codes, route_names = _factorize_text(df[route_col])
+
+    matches = {}
+    for route_type in STATE_ROUTE_TYPES:
+        pattern, _ = STATE_ROUTE_RULES[route_type]
+        matches[route_type] = route_names.str.contains(pattern, case=False, na=False, regex=True).to_numpy()[codes]
+    return matches
+
+
+def local_route_mask(df: pd.DataFrame) -> pd.Series:
+    """
+    Boolean mask of records not on state routes (Interstate, US, State, Business).
+    Returns None if no route name column is present.
+    """
+    matches = state_route_matches(df)
+    if matches is None:
+        return None
+
+    mask = np.ones(len(df), dtype=bool)
+    for route_mask in matches.values():
+        mask &= ~route_mask
+    return pd.Series(mask, index=df.index)
+
+
+def nonvdot_system_mask(df: pd.DataFrame) -> pd.Series:
+    """
+    Boolean mask of NonVDOT records in the SYSTEM column.
+    Returns None if no SYSTEM column is present.
+    """
+    system_col = _find_column(df, SYSTEM_COLUMNS)
+    if system_col is None:
+        return None
+
+    mask = _map_distinct(df[system_col], lambda v: v.str.upper().str.contains('NONVDOT', na=False))
+    return pd.Series(mask, index=df.index)
+
+
+def crash_filter_mask(df: pd.DataFrame) -> tuple:
+    """
+    Evaluate the Henrico County, state route and NonVDOT filters in one pass.
+    Returns the combined mask and the number of rows each rule dropped, with
+    each row counted against the first rule (in that order) that rejects it.
+    Rules whose column is missing are skipped and reported with a count of None.
+    """
+    keep = henrico_county_mask(df).to_numpy().copy()
+    drops = {'henrico': int(len(df) - keep.sum())}
+
+    matches = state_route_matches(df)
+    for route_type in STATE_ROUTE_TYPES:
+        if matches is None:
+            drops[f'route_{route_type}'] = None
+            continue
+        dropped = keep & matches[route_type]
+        drops[f'route_{route_type}'] = int(dropped.sum())
+        keep &= ~dropped
+
+    system_mask = nonvdot_system_mask(df)
+    if system_mask is None:
+        drops['nonvdot'] = None
+    else:
+        dropped = keep & ~system_mask.to_numpy()
+        drops['nonvdot'] = int(dropped.sum())
+        keep &= ~dropped
+
+    return pd.Series(keep, index=df.index), drops
+
+
+def filter_henrico_county(df: pd.DataFrame) -> pd.DataFrame:
+    """Filter dataframe to only include Henrico County records."""
+    original_count = len(df)
+
+    df_filtered = df[henrico_county_mask(df)].copy()
 
     logger.info(f"Filtered from {original_count} to {len(df_filtered)} Henrico County records")
 
@@ -201,37 +1028,11 @@ def filter_exclude_state_routes(df: pd.DataFrame) -> pd.DataFrame:
     """
     original_count = len(df)
 
-    # Find the route name column
-    route_columns = ['RTE_NM', 'RTE_NAME', 'RTE NAME', 'Rte_Name', 'Route_Name', 'ROUTE_NAME', 'RTE_Name', 'RTE Name']
-    route_col = None
-    for col in route_columns:
-        if col in df.columns:
-            route_col = col
-            break
-
-    if route_col is None:
+    mask = local_route_mask(df)
+    if mask is None:
         logger.warning("Could not find route name column, skipping state route filter")
         return df
 
-    # Filter out state routes
-    # Route patterns: R-VA (state primary), I- (Interstate), US (US route)
-    # Keep: S-VA043 (secondary county roads)
-    mask = pd.Series([True] * len(df))
-
-    route_values = df[route_col].astype(str)
-
-    # Exclude Interstate routes (I-64, I-95, etc.)
-    mask &= ~route_values.str.contains(r'^I-|^R-VA\s*IS', case=False, na=False, regex=True)
-
-    # Exclude US routes
-    mask &= ~route_values.str.contains(r'^R-VA\s*US|US\d+', case=False, na=False, regex=True)
-
-    # Exclude state routes (but keep secondary/county roads starting with S-)
-    mask &= ~route_values.str.contains(r'^R-VA\s*SR|^R-VA\s*\d', case=False, na=False, regex=True)
-
-    # Exclude business routes
-    mask &= ~route_values.str.contains(r'^R-VA\s*B|BUSINESS', case=False, na=False, regex=True)
-
     df_filtered = df[mask].copy()
 
     logger.info(f"Filtered from {original_count} to {len(df_filtered)} records after excluding state routes")
@@ -245,20 +1046,11 @@ def filter_nonvdot_system(df: pd.DataFrame) -> pd.DataFrame:
     """
     original_count = len(df)
 
-    # Find the SYSTEM column
-    system_columns = ['SYSTEM', 'System', 'system']
-    system_col = None
-    for col in system_columns:
-        if col in df.columns:
-            system_col = col
-            break
-
-    if system_col is None:
+    mask = nonvdot_system_mask(df)
+    if mask is None:
         logger.warning("Could not find SYSTEM column, skipping NonVDOT filter")
         return df
 
-    # Filter to only keep NonVDOT records
-    mask = df[system_col].astype(str).str.upper().str.contains('NONVDOT', na=False)
     df_filtered = df[mask].copy()
 
     logger.info(f"Filtered from {original_count} to {len(df_filtered)} NonVDOT records")
@@ -266,157 +1058,362 @@ def filter_nonvdot_system(df: pd.DataFrame) -> pd.DataFrame:
     return df_filtered
 
 
+def iter_filtered_frames(frames, stats: dict):
+    """
+    Apply the Henrico County, state route and NonVDOT filters to each frame
+    as it arrives, recording per-rule drop counts in `stats`.
+    """
+    for df in frames:
+        mask, drops = crash_filter_mask(df)
+
+        stats['downloaded'] += len(df)
+        for rule, dropped in drops.items():
+            if dropped is None:
+                stats['missing'].add(rule)
+            else:
+                stats['dropped'][rule] = stats['dropped'].get(rule, 0) + dropped
+
+        df = df[mask]
+        if not df.empty:
+            yield df
+
+
+def new_filter_stats() -> dict:
+    """Create an empty row counter for iter_filtered_frames."""
+    return {'downloaded': 0, 'dropped': {}, 'missing': set()}
+
+
+def filter_stage_counts(stats: dict) -> dict:
+    """Row counts remaining after the Henrico, state route and NonVDOT stages."""
+    dropped = stats['dropped']
+    henrico = stats['downloaded'] - dropped.get('henrico', 0)
+    local_routes = henrico - sum(dropped.get(f'route_{route_type}', 0) for route_type in STATE_ROUTE_TYPES)
+    nonvdot = local_routes - dropped.get('nonvdot', 0)
+    return {'henrico': henrico, 'local_routes': local_routes, 'nonvdot': nonvdot}
+
+
+def log_filter_stats(stats: dict) -> None:
+    """Log the row counts recorded by iter_filtered_frames."""
+    if any(rule.startswith('route_') for rule in stats['missing']):
+        logger.warning("Could not find route name column, skipped state route filter")
+    if 'nonvdot' in stats['missing']:
+        logger.warning("Could not find SYSTEM column, skipped NonVDOT filter")
+
+    counts = filter_stage_counts(stats)
+    logger.info(f"Filtered from {stats['downloaded']} to {counts['henrico']} Henrico County records")
+    logger.info(f"Filtered from {counts['henrico']} to {counts['local_routes']} records after excluding state routes")
+    route_drops = ', '.join(f"{route_type}={stats['dropped'].get(f'route_{route_type}', 0)}"
+                            for route_type in STATE_ROUTE_TYPES)
+    logger.info(f"State route records dropped by type: {route_drops}")
+    logger.info(f"Filtered from {counts['local_routes']} to {counts['nonvdot']} NonVDOT records")
+
+
 def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Standardize column names to match expected format for index.html."""
-    # Comprehensive mapping from API column names to expected column names
-    column_mapping = {
-        # Core identifiers
-        'OBJECTID': 'OBJECTID',
-        'DOCUMENT_NBR': 'Document Nbr',
-        'Document_Nbr': 'Document Nbr',
-
-        # Crash timing
-        'CRASH_YEAR': 'Crash Year',
-        'Crash_Year': 'Crash Year',
-        'CRASH_DT': 'Crash Date',
-        'Crash_Date': 'Crash Date',
-        'CRASH_MILITARY_TM': 'Crash Military Time',
-        'Crash_Military_Time': 'Crash Military Time',
-
-        # Severity
-        'CRASH_SEVERITY': 'Crash Severity',
-        'Crash_Severity': 'Crash Severity',
-        'K_PEOPLE': 'K_People',
-        'A_PEOPLE': 'A_People',
-        'B_PEOPLE': 'B_People',
-        'C_PEOPLE': 'C_People',
-
-        # Injury counts
-        'PERSONS_INJURED': 'Persons Injured',
-        'Persons_Injured': 'Persons Injured',
-        'PEDESTRIANS_KILLED': 'Pedestrians Killed',
-        'Pedestrians_Killed': 'Pedestrians Killed',
-        'PEDESTRIANS_INJURED': 'Pedestrians Injured',
-        'Pedestrians_Injured': 'Pedestrians Injured',
-        'VEH_COUNT': 'Vehicle Count',
-        'Vehicle_Count': 'Vehicle Count',
-
-        # Crash characteristics
-        'COLLISION_TYPE': 'Collision Type',
-        'Collision_Type': 'Collision Type',
-        'WEATHER_CONDITION': 'Weather Condition',
-        'Weather_Condition': 'Weather Condition',
-        'LIGHT_CONDITION': 'Light Condition',
-        'Light_Condition': 'Light Condition',
-        'ROADWAY_SURFACE_COND': 'Roadway Surface Condition',
-        'Roadway_Surface_Condition': 'Roadway Surface Condition',
-        'RELATION_TO_ROADWAY': 'Relation To Roadway',
-        'Relation_To_Roadway': 'Relation To Roadway',
-        'ROADWAY_ALIGNMENT': 'Roadway Alignment',
-        'Roadway_Alignment': 'Roadway Alignment',
-        'ROADWAY_SURFACE_TYPE': 'Roadway Surface Type',
-        'Roadway_Surface_Type': 'Roadway Surface Type',
-        'ROADWAY_DEFECT': 'Roadway Defect',
-        'Roadway_Defect': 'Roadway Defect',
-        'ROADWAY_DESCRIPTION': 'Roadway Description',
-        'Roadway_Description': 'Roadway Description',
-
-        # Intersection/control
-        'INTERSECTION_TYPE': 'Intersection Type',
-        'Intersection_Type': 'Intersection Type',
-        'TRAFFIC_CONTROL_TYPE': 'Traffic Control Type',
-        'Traffic_Control_Type': 'Traffic Control Type',
-        'TRFC_CTRL_STATUS_TYPE': 'Traffic Control Status',
-        'Traffic_Control_Status': 'Traffic Control Status',
-
-        # Work zone / school
-        'WORK_ZONE_RELATED': 'Work Zone Related',
-        'Work_Zone_Related': 'Work Zone Related',
-        'WORK_ZONE_LOCATION': 'Work Zone Location',
-        'Work_Zone_Location': 'Work Zone Location',
-        'WORK_ZONE_TYPE': 'Work Zone Type',
-        'Work_Zone_Type': 'Work Zone Type',
-        'SCHOOL_ZONE': 'School Zone',
-        'School_Zone': 'School Zone',
-
-        # First harmful event
-        'FIRST_HARMFUL_EVENT': 'First Harmful Event',
-        'First_Harmful_Event': 'First Harmful Event',
-        'FIRST_HARMFUL_EVENT_LOC': 'First Harmful Event Loc',
-        'First_Harmful_Event_Loc': 'First Harmful Event Loc',
-
-        # Jurisdiction
-        'JURIS_CODE': 'Juris Code',
-        'Juris_Code': 'Juris Code',
-        'PHYSICAL_JURIS': 'Physical Juris Name',
-        'Physical_Juris_Name': 'Physical Juris Name',
-
-        # Road classification
-        'FUN': 'Functional Class',
-        'Functional_Class': 'Functional Class',
-        'FAC': 'Facility Type',
-        'Facility_Type': 'Facility Type',
-        'AREA_TYPE': 'Area Type',
-        'Area_Type': 'Area Type',
-        'SYSTEM': 'SYSTEM',
-        'VSP': 'VSP',
-        'OWNERSHIP': 'Ownership',
-
-        # Planning/admin
-        'PLAN_DISTRICT': 'Planning District',
-        'Planning_District': 'Planning District',
-        'MPO_NAME': 'MPO Name',
-        'MPO_Name': 'MPO Name',
-        'VDOT_DISTRICT': 'VDOT District',
-        'VDOT_District': 'VDOT District',
-
-        # Route/location
-        'RTE_NM': 'RTE Name',
-        'RTE_NAME': 'RTE Name',
-        'RTE_Name': 'RTE Name',
-        'RNS_MP': 'RNS MP',
-        'NODE': 'Node',
-        'OFFSET': 'Node Offset (ft)',
-        'Node_Offset': 'Node Offset (ft)',
-
-        # Coordinates (keep lowercase)
-        'x': 'x',
-        'y': 'y',
-
-        # Boolean flags
-        'ALCOHOL_NOTALCOHOL': 'Alcohol?',
-        'BIKE_NONBIKE': 'Bike?',
-        'PED_NONPED': 'Pedestrian?',
-        'SPEED_NOTSPEED': 'Speed?',
-        'DISTRACTED_NOTDISTRACTED': 'Distracted?',
-        'DROWSY_NOTDROWSY': 'Drowsy?',
-        'HITRUN_NOT_HITRUN': 'Hitrun?',
-        'SENIOR_NOTSENIOR': 'Senior?',
-        'YOUNG_NOTYOUNG': 'Young?',
-        'NIGHT': 'Night?',
-        'BELTED_UNBELTED': 'Unrestrained?',
-        'MOTOR_NONMOTOR': 'Motorcycle?',
-
-        # Additional boolean flags
-        'DRUG_NODRUG': 'Drug Related?',
-        'GR_NOGR': 'Guardrail Related?',
-        'LGTRUCK_NONLGTRUCK': 'Lgtruck?',
-        'MAINLINE_YN': 'Mainline?',
-
-        # Speed and road attributes
-        'SPEED_DIFF_MAX': 'Max Speed Diff',
-        'RD_TYPE': 'RoadDeparture Type',
-    }
-
     # Rename columns that exist
-    rename_dict = {k: v for k, v in column_mapping.items() if k in df.columns}
+    rename_dict = {k: v for k, v in COLUMN_MAPPING.items() if k in df.columns}
     df = df.rename(columns=rename_dict)
 
     return df
 
 
-def main():
+def iter_standardized_frames(frames):
+    """Standardize column names of each frame as it arrives."""
+    for df in frames:
+        yield standardize_columns(df)
+
+
+def _record_schema_issue(issues: dict, col: str, bad_values: pd.Series) -> None:
+    """Record values of a column that did not fit the schema."""
+    if issues is None or bad_values.empty:
+        return
+    issue = issues.setdefault(col, {'count': 0, 'examples': set()})
+    issue['count'] += len(bad_values)
+    for value in bad_values.unique()[:5]:
+        if len(issue['examples']) < 5:
+            issue['examples'].add(str(value))
+
+
+def _parse_crash_dates(values: pd.Series) -> pd.Series:
+    """Parse crash dates to naive Virginia local timestamps."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return _to_crash_timezone(values)
+
+    # ArcGIS returns dates as epoch milliseconds in UTC; the fallback CSV has date
+    # strings, and an incrementally merged output can hold both
+    numbers = values if pd.api.types.is_numeric_dtype(values) else pd.to_numeric(values, errors='coerce')
+    parsed = _to_crash_timezone(pd.to_datetime(numbers, unit='ms', utc=True, errors='coerce'))
+    is_text = (numbers.isna() & values.notna()).to_numpy()
+    if is_text.any():
+        text = pd.to_datetime(values[is_text], errors='coerce', format='mixed')
+        parsed[is_text] = _to_crash_timezone(text).to_numpy()
+    return parsed
+
+
+def _to_crash_timezone(parsed: pd.Series) -> pd.Series:
+    """Convert timezone-aware timestamps to naive Virginia local time."""
+    if getattr(parsed.dt, 'tz', None) is not None:
+        parsed = parsed.dt.tz_convert(CRASH_TIMEZONE).dt.tz_localize(None)
+    return parsed
+
+
+def apply_crash_schema(df: pd.DataFrame, issues: dict = None) -> pd.DataFrame:
+    """
+    Cast standardized crash data to its compact typed schema: Y/N flags to
+    boolean, coded fields to category, counts to small nullable integers and
+    dates to datetime. Values that don't fit become missing in the typed
+    frame and are recorded in `issues` as {column: {'count', 'examples'}}.
+    The typed frame feeds the Parquet copy and the derived outputs; the CSV
+    output keeps the source values.
+    """
+    df = df.copy()
+
+    for col in FLAG_COLUMNS:
+        if col in df.columns and not pd.api.types.is_bool_dtype(df[col]):
+            text = df[col].astype('string').str.strip().str.upper()
+            flags = text.map(FLAG_VALUES).astype('boolean')
+            _record_schema_issue(issues, col, df[col][text.notna() & (text != '') & flags.isna()])
+            df[col] = flags
+
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            numbers = pd.to_numeric(df[col], errors='coerce')
+            fits = numbers.isna() | ((numbers == numbers.round()) & numbers.between(-32768, 32767))
+            _record_schema_issue(issues, col, df[col][(df[col].notna() & numbers.isna()) | ~fits])
+            df[col] = numbers.where(fits).astype('Int16')
+
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            numbers = pd.to_numeric(df[col], errors='coerce')
+            _record_schema_issue(issues, col, df[col][df[col].notna() & numbers.isna()])
+            df[col] = numbers
+
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            dates = _parse_crash_dates(df[col])
+            _record_schema_issue(issues, col, df[col][df[col].notna() & dates.isna()])
+            df[col] = dates
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    if 'Document Nbr' in df.columns:
+        df['Document Nbr'] = df['Document Nbr'].astype('string')
+
+    return df
+
+
+def log_schema_issues(issues: dict) -> None:
+    """Log values that did not fit the typed crash schema."""
+    for col, issue in sorted(issues.items()):
+        examples = ', '.join(sorted(issue['examples']))
+        logger.warning(f"{issue['count']} values in {col} did not fit the schema; kept as-is in the CSV, "
+                       f"missing in the Parquet copy and derived outputs (e.g. {examples})")
+
+
+def read_crash_csv(path: str = None, issues: dict = None) -> pd.DataFrame:
+    """
+    Read a crash CSV written by this script back into the typed schema,
+    recording values that don't fit in `issues`.
+    """
+    df = pd.read_csv(path or OUTPUT_FILE, dtype={'Document Nbr': str}, low_memory=False)
+    return apply_crash_schema(df, issues)
+
+
+def write_csv_stream(frames, path: str) -> int:
+    """
+    Append frames to a CSV file as they arrive, returning the number of rows written.
+    The first frame fixes the column order; later frames are aligned to it.
+    """
+    columns = None
+    rows = 0
+    with open(path, 'w', newline='') as f:
+        for df in frames:
+            if columns is None:
+                columns = list(df.columns)
+                df.to_csv(f, index=False)
+            else:
+                df.reindex(columns=columns).to_csv(f, index=False, header=False)
+            rows += len(df)
+    return rows
+
+
+def _parquet_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Serialize one partition to Parquet. Categories are stored as string
+    dictionaries with int32 indices, so every partition file has the same
+    schema however many categories it holds (including none).
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = [
+        field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        if pa.types.is_dictionary(field.type) else field
+        for field in table.schema
+    ]
+    table = table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+    buffer = pa.BufferOutputStream()
+    pq.write_table(table, buffer)
+    return buffer.getvalue().to_pybytes()
+
+
+def write_parquet_output(df: pd.DataFrame = None, parquet_dir: str = None) -> None:
+    """
+    Write a Parquet copy of the typed crash data (read from the crash CSV if
+    not given), one file per Crash Year partition.
+    Partition files whose content is unchanged are left untouched, changed ones
+    are swapped in whole, and partitions of years no longer present are removed,
+    so readers always find a complete dataset and a rerun on the same data
+    changes no file.
+    """
+    parquet_dir = parquet_dir or PARQUET_DIR
+
+    if df is None:
+        df = read_crash_csv()
+    if PARQUET_PARTITION_COLUMN not in df.columns:
+        raise Exception(f"{PARQUET_PARTITION_COLUMN} column missing, cannot partition columnar output")
+
+    years = df[PARQUET_PARTITION_COLUMN].astype('string').fillna(PARQUET_NULL_PARTITION)
+    df = df.drop(columns=[PARQUET_PARTITION_COLUMN])
+
+    partitions = set()
+    written = 0
+    os.makedirs(parquet_dir, exist_ok=True)
+    for year, part in df.groupby(years, sort=True):
+        partition = f"{PARQUET_PARTITION_COLUMN}={year}"
+        partitions.add(partition)
+
+        # Categories used only by other years would otherwise change this year's file
+        for col in part.select_dtypes('category').columns:
+            part[col] = part[col].cat.remove_unused_categories()
+        body = _parquet_bytes(part.reset_index(drop=True))
+
+        path = os.path.join(parquet_dir, partition, PARQUET_PART_FILENAME)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                if f.read() == body:
+                    continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Dot-prefixed, so Parquet readers skip the file while it is being written
+        tmp_path = os.path.join(os.path.dirname(path), "." + PARQUET_PART_FILENAME + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        written += 1
+
+    # Remove partitions of years no longer present, and files left by older layouts
+    removed = 0
+    for name in os.listdir(parquet_dir):
+        partition_dir = os.path.join(parquet_dir, name)
+        if name not in partitions:
+            if os.path.isdir(partition_dir):
+                shutil.rmtree(partition_dir)
+            else:
+                os.remove(partition_dir)
+            removed += 1
+            continue
+        for filename in os.listdir(partition_dir):
+            if filename != PARQUET_PART_FILENAME:
+                os.remove(os.path.join(partition_dir, filename))
+
+    logger.info(f"Saved columnar copy of {len(df)} records to {parquet_dir} "
+                f"({len(partitions)} partitions, {written} written, {removed} removed)")
+
+
+def load_crashes(columns: list = None, years: list = None, parquet_dir: str = None) -> pd.DataFrame:
+    """
+    Load crash data from the columnar output.
+    Only the requested columns and Crash Year partitions are read from disk.
+    """
+    parquet_dir = parquet_dir or PARQUET_DIR
+    # Plain (not dictionary) partition values, so the partition of rows without a
+    # Crash Year reads back as missing
+    dataset = ds.dataset(parquet_dir, format='parquet', partitioning='hive')
+    year_filter = ds.field(PARQUET_PARTITION_COLUMN).isin([int(year) for year in years]) if years else None
+    df = dataset.to_table(columns=columns, filter=year_filter).to_pandas()
+
+    if PARQUET_PARTITION_COLUMN in df.columns:
+        df[PARQUET_PARTITION_COLUMN] = df[PARQUET_PARTITION_COLUMN].astype('Int16')
+
+    return df
+
+
+# Dashboard artifacts derived from the crash output:
+# (description, writer(df, output_dir), files it writes under the output directory)
+DERIVED_OUTPUTS = [
+    ('aggregate cube', crash_aggregates.write_crash_cube, [crash_aggregates.CUBE_FILENAME]),
+    ('spatial index', crash_spatial.write_spatial_outputs,
+     [crash_spatial.SPATIAL_INDEX_FILENAME, crash_spatial.HOTSPOTS_FILENAME]),
+    ('map tiles', crash_tiles.write_tiles, [os.path.join(crash_tiles.TILES_DIRNAME, crash_tiles.TILES_MANIFEST)]),
+    ('network screening', network_screening.write_network_screening, [network_screening.SCREENING_FILENAME]),
+    ('safety screening', safety_screening.write_safety_screening,
+     [safety_screening.SCREENING_FILENAME, safety_screening.PARAMETERS_FILENAME]),
+]
+
+# Modules whose code shapes the outputs; a change to any of them invalidates the
+# input fingerprint of the last run
+PIPELINE_MODULES = [crash_aggregates, crash_spatial, crash_tiles, http_client, network_screening, safety_screening]
+
+
+def pipeline_files() -> list:
+    """Source files of this script and every module that shapes its outputs."""
+    return [os.path.abspath(__file__)] + [os.path.abspath(module.__file__) for module in PIPELINE_MODULES]
+
+
+def outputs_exist() -> bool:
+    """Check that the crash CSV, its Parquet copy and every derived output are on disk."""
+    paths = [OUTPUT_FILE, PARQUET_DIR] + [
+        os.path.join(OUTPUT_DIR, filename) for _, _, filenames in DERIVED_OUTPUTS for filename in filenames
+    ]
+    return all(os.path.exists(path) for path in paths)
+
+
+def write_derived_outputs(df: pd.DataFrame = None) -> list:
+    """
+    Write the precomputed dashboard artifacts from the typed crash data.
+    A failing artifact is logged and skipped; the crash output itself is already saved.
+    Returns the descriptions of the artifacts that failed.
+    """
+    if df is None:
+        df = read_crash_csv()
+
+    failed = []
+    for name, writer, _ in DERIVED_OUTPUTS:
+        try:
+            writer(df, OUTPUT_DIR)
+        except Exception as e:
+            logger.warning(f"Could not write {name}: {e}")
+            failed.append(name)
+    return failed
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Download Henrico County crash data.")
+    parser.add_argument(
+        '--workers', type=int, default=DOWNLOAD_WORKERS,
+        help=f"number of ArcGIS pages to fetch concurrently (default: {DOWNLOAD_WORKERS})"
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="only download records newer than the saved watermark and merge them into the existing output"
+    )
+    parser.add_argument(
+        '--no-pushdown', dest='pushdown', action='store_false',
+        help="download every Henrico record and apply the route and system filters locally only"
+    )
+    parser.add_argument(
+        '--all-fields', dest='project', action='store_false',
+        help="request every layer field instead of only the fields the output uses"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main function to download and process crash data."""
+    args = parse_args(argv)
+
     logger.info("=" * 60)
     logger.info(f"Starting crash data download at {datetime.now()}")
     logger.info("=" * 60)
@@ -424,50 +1421,120 @@ def main():
     # Ensure output directory exists
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+    watermark = load_watermark() if args.incremental else None
+    started_at = datetime.now()
+    # Full downloads stream into a temporary file that replaces the output once complete
+    tmp_file = OUTPUT_FILE + ".tmp"
     df = None
+    http_client.reset_fingerprint()
+    # One pooled connection per page worker, plus one for count/probe requests
+    http_client.configure_session(pool_size=args.workers + 1)
 
-    # Try primary API first
+    # Try primary API first; every page is spooled to disk before any is processed
+    from_fallback = False
+    response = None
     try:
-        df = download_from_arcgis()
+        downloaded = download_arcgis_pages(args.workers, watermark, args.pushdown, args.project)
     except Exception as e:
         logger.error(f"Primary API failed: {e}")
         logger.info("Falling back to CSV download...")
+        from_fallback = True
+
+    if watermark is not None and not from_fallback and downloaded == 0:
+        logger.info("No new or revised crash records since last download, output unchanged")
+        clear_spool()
+        return 0
 
     # Try fallback if primary failed
-    if df is None or df.empty:
+    if from_fallback:
+        watermark = None
         try:
-            df = download_from_fallback()
+            response = download_fallback_csv()
         except Exception as e:
             logger.error(f"Fallback download also failed: {e}")
             sys.exit(1)
 
-    # Filter data
-    logger.info("Applying filters...")
-    df = filter_henrico_county(df)
+    # Skip processing when every upstream response and the pipeline code are
+    # byte-identical to the last successful run and all of its outputs are still there
+    inputs_fingerprint = http_client.fingerprint(extra_files=pipeline_files())
+    if outputs_exist() and http_client.inputs_unchanged('crashes', inputs_fingerprint):
+        logger.info("Upstream data unchanged since last run, output unchanged")
+        clear_spool()
+        return 0
 
-    if df.empty:
-        logger.error("No Henrico County records found after filtering!")
+    stats = new_filter_stats()
+    try:
+        frames = iter_fallback_frames(response=response) if from_fallback else iter_spooled_frames()
+        frames = iter_standardized_frames(iter_filtered_frames(frames, stats))
+        if watermark is not None:
+            df = pd.concat(list(frames) or [pd.DataFrame()], ignore_index=True)
+        else:
+            write_csv_stream(frames, tmp_file)
+    except Exception as e:
+        logger.error(f"Processing the {'fallback' if from_fallback else 'API'} download failed: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
         sys.exit(1)
 
-    df = filter_exclude_state_routes(df)
+    # Filters were applied page by page while reading the download
+    log_filter_stats(stats)
+    counts = filter_stage_counts(stats)
+
+    # An incremental download may legitimately contain no relevant records
+    if watermark is None:
+        if counts['henrico'] == 0:
+            logger.error("No Henrico County records found after filtering!")
+        elif counts['local_routes'] == 0:
+            logger.error("No records remaining after excluding state routes!")
+        elif counts['nonvdot'] == 0:
+            logger.error("No NonVDOT records found after filtering!")
+        if counts['nonvdot'] == 0:
+            os.remove(tmp_file)
+            sys.exit(1)
 
-    if df.empty:
-        logger.error("No records remaining after excluding state routes!")
-        sys.exit(1)
+    if watermark is not None:
+        if df.empty:
+            logger.info("No new or revised Henrico records since last download, output unchanged")
+            return 0
+        df = merge_incremental(df)
+
+        # Save to CSV; the merged file replaces the output only once complete, so an
+        # interrupted run never leaves a truncated history behind the watermark
+        logger.info(f"Saving {len(df)} records to {OUTPUT_FILE}")
+        df.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, OUTPUT_FILE)
+    else:
+        logger.info(f"Saving {counts['nonvdot']} records to {OUTPUT_FILE}")
+        os.replace(tmp_file, OUTPUT_FILE)
 
-    # Filter to only include NonVDOT system records
-    df = filter_nonvdot_system(df)
+    # One typed copy of the saved output feeds the schema check, the Parquet
+    # copy, the derived outputs and the watermark
+    issues = {}
+    df = read_crash_csv(issues=issues)
+    log_schema_issues(issues)
 
-    if df.empty:
-        logger.error("No NonVDOT records found after filtering!")
-        sys.exit(1)
+    complete = True
+    try:
+        write_parquet_output(df)
+    except Exception as e:
+        logger.warning(f"Could not write columnar output: {e}")
+        complete = False
 
-    # Standardize column names
-    df = standardize_columns(df)
+    if write_derived_outputs(df):
+        complete = False
+
+    # OBJECTIDs in the fallback export are not guaranteed to match the API,
+    # so only API downloads advance the watermark
+    if from_fallback:
+        if os.path.exists(WATERMARK_FILE):
+            os.remove(WATERMARK_FILE)
+    else:
+        full_refresh_at = started_at if watermark is None else datetime.fromisoformat(watermark['full_refresh_at'])
+        save_watermark(df, full_refresh_at)
 
-    # Save to CSV
-    logger.info(f"Saving {len(df)} records to {OUTPUT_FILE}")
-    df.to_csv(OUTPUT_FILE, index=False)
+    # A run with missing outputs must not let the next run skip on unchanged inputs
+    if complete:
+        http_client.record_inputs('crashes', inputs_fingerprint)
 
     logger.info("=" * 60)
     logger.info(f"Successfully downloaded {len(df)} crash records")
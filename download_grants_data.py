@@ -4,17 +4,20 @@ Download traffic safety grants from Grants.gov and include Virginia-specific gra
 Filters for transportation category, safety-related CFDA numbers, and keywords.
 """
 
-import io
 import logging
 import os
-import re
 import sys
+import xml.etree.ElementTree as ET
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import pandas as pd
 import requests
 
+import http_client
+from term_matcher import TermMatcher
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -57,6 +60,70 @@ SAFETY_KEYWORDS = [
 # Relevant agencies
 SAFETY_AGENCIES = ['NHTSA', 'FHWA', 'DOT', 'Department of Transportation', 'Highway Administration']
 
+# Source columns checked by each filter, across the extract's naming variants
+CFDA_COLUMNS = [
+    'CFDANumbers', 'CFDA_Numbers', 'cfda_numbers', 'CfdaNumber',
+    'CFDANumber', 'CFDA', 'cfda'
+]
+AGENCY_COLUMNS = [
+    'AgencyName', 'Agency', 'agency_name', 'AGENCY_NAME',
+    'GrantorContactName', 'FundingAgency', 'AgencyCode'
+]
+TITLE_COLUMNS = [
+    'OpportunityTitle', 'Title', 'opportunity_title',
+    'OPPORTUNITY_TITLE', 'Grant_Title', 'ProjectTitle'
+]
+DESCRIPTION_COLUMNS = [
+    'Description', 'OpportunityDescription', 'description',
+    'DESCRIPTION', 'Synopsis', 'Abstract', 'Summary'
+]
+CLOSE_DATE_COLUMNS = [
+    'CloseDate', 'close_date', 'CLOSE_DATE', 'ApplicationDueDate',
+    'DueDate', 'Deadline', 'ResponseDate'
+]
+
+# Grants.gov columns -> output columns (the first match wins for each output column)
+OUTPUT_COLUMN_MAPPINGS = {
+    'OpportunityID': 'grant_id',
+    'OpportunityNumber': 'grant_id',
+    'OpportunityTitle': 'title',
+    'AgencyName': 'agency',
+    'CFDANumbers': 'cfda_number',
+    'Description': 'description',
+    'Synopsis': 'description',
+    'CloseDate': 'close_date',
+    'PostDate': 'post_date',
+    'AwardCeiling': 'award_ceiling',
+    'AwardFloor': 'award_floor',
+    'AdditionalInformationURL': 'application_url',
+    'GrantorContactEmail': 'contact_info',
+    'relevance_score': 'relevance_score',
+    'matched_terms': 'matched_terms',
+}
+
+# Lowercased names of every source column the filters and output mapping read;
+# everything else in the extract is skipped while parsing
+EXTRACT_FIELDS = {
+    col.lower()
+    for col in (CFDA_COLUMNS + AGENCY_COLUMNS + TITLE_COLUMNS + DESCRIPTION_COLUMNS
+                + CLOSE_DATE_COLUMNS + list(OUTPUT_COLUMN_MAPPINGS))
+}
+
+# Term matchers for the filters, built once; they match case-insensitively
+CFDA_MATCHER = TermMatcher(SAFETY_CFDA_NUMBERS)
+AGENCY_MATCHER = TermMatcher(SAFETY_AGENCIES)
+KEYWORD_MATCHER = TermMatcher(SAFETY_KEYWORDS)
+
+# Matcher for each kind of match, in the order matched terms are reported
+TERM_MATCHERS = {'cfda': CFDA_MATCHER, 'agency': AGENCY_MATCHER, 'keyword': KEYWORD_MATCHER}
+
+# Repeated child elements of an XML record (e.g. several CFDANumbers) are joined
+# into one field with this separator
+REPEATED_FIELD_SEPARATOR = ';'
+
+# Relevance score contributed by each distinct matched term, by kind of match
+RELEVANCE_WEIGHTS = {'cfda': 3, 'keyword': 2, 'agency': 1}
+
 # Output configuration
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "grants.csv")
@@ -64,6 +131,15 @@ OUTPUT_FILE = os.path.join(OUTPUT_DIR, "grants.csv")
 # Number of days to look back for extracts if today's isn't available
 MAX_LOOKBACK_DAYS = 7
 
+# Read timeout (seconds) for the HEAD probes that find which extracts exist
+PROBE_TIMEOUT = 30
+
+# Opportunities are parsed from the extract in chunks of this many records
+EXTRACT_CHUNK_ROWS = 10000
+
+# Bytes read from the start of the opportunities file to detect its format
+SNIFF_BYTES = 4096
+
 # Virginia Static Grants - always included as baseline
 VIRGINIA_STATIC_GRANTS = [
     {
@@ -235,76 +311,67 @@ def get_grants_url(target_date: datetime) -> str:
     return GRANTS_URL_TEMPLATE.format(date=date_str)
 
 
-def download_grants_extract(max_attempts: int = MAX_LOOKBACK_DAYS) -> pd.DataFrame:
+def probe_grants_extract(url: str):
     """
-    Download and extract Grants.gov data.
-    Tries today's extract first, then looks back up to max_attempts days.
+    Check whether an extract exists with a HEAD request.
+    Returns True if it exists, False if the server reports it missing,
+    or None if the probe was inconclusive.
     """
-    target_date = datetime.now()
+    try:
+        response = http_client.get_session().head(
+            url, allow_redirects=True, timeout=http_client.request_timeout(PROBE_TIMEOUT)
+        )
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Probe failed for {url}: {e}")
+        return None
+
+    if response.status_code == 200:
+        return True
+    # S3 answers 403 rather than 404 for missing keys on buckets without list access
+    if response.status_code in (403, 404):
+        return False
+    logger.warning(f"HTTP {response.status_code} probing {url}")
+    return None
+
+
+def probe_grants_extract_dates(max_attempts: int = MAX_LOOKBACK_DAYS) -> list:
+    """
+    Probe the extracts for today and the previous max_attempts - 1 days concurrently.
+    Returns the URLs worth downloading, newest first: extracts that exist,
+    plus any whose probe was inconclusive.
+    """
+    today = datetime.now()
+    urls = [get_grants_url(today - timedelta(days=day)) for day in range(max_attempts)]
+
+    with ThreadPoolExecutor(max_workers=max(len(urls), 1)) as executor:
+        results = list(executor.map(probe_grants_extract, urls))
+
+    for url, found in zip(urls, results):
+        if found is False:
+            logger.info(f"Extract not found: {url}")
+    return [url for url, found in zip(urls, results) if found is not False]
+
+
+def find_grants_extract(max_attempts: int = MAX_LOOKBACK_DAYS):
+    """
+    Download the newest Grants.gov extract through the HTTP cache.
+    Probes today's extract and the previous days first, then downloads
+    the newest one that exists.
+    Returns the cached response, or None if no extract was found.
+    """
+    candidates = probe_grants_extract_dates(max_attempts)
 
-    for attempt in range(max_attempts):
-        url = get_grants_url(target_date)
+    for url in candidates:
         logger.info(f"Attempting to download: {url}")
 
         try:
-            response = requests.get(url, timeout=300)
+            response = http_client.cached_get(url, timeout=300)
 
             if response.status_code == 200:
-                logger.info(f"Successfully downloaded extract for {target_date.strftime('%Y-%m-%d')}")
-
-                # Extract ZIP file
-                with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
-                    file_list = zf.namelist()
-                    logger.info(f"Files in archive: {file_list}")
-
-                    # Look for opportunities data file
-                    opportunities_file = None
-                    for filename in file_list:
-                        if 'opportunit' in filename.lower():
-                            opportunities_file = filename
-                            break
-
-                    if opportunities_file is None:
-                        for filename in file_list:
-                            if filename.endswith('.csv') or filename.endswith('.xml'):
-                                opportunities_file = filename
-                                break
-
-                    if opportunities_file is None and file_list:
-                        opportunities_file = file_list[0]
-
-                    if opportunities_file:
-                        logger.info(f"Reading file: {opportunities_file}")
-
-                        with zf.open(opportunities_file) as f:
-                            content = f.read()
-
-                            # Try to parse as CSV first
-                            try:
-                                df = pd.read_csv(io.BytesIO(content), low_memory=False)
-                                logger.info(f"Parsed {len(df)} records from CSV")
-                                return df
-                            except Exception:
-                                pass
-
-                            # Try to parse as XML
-                            try:
-                                df = pd.read_xml(io.BytesIO(content))
-                                logger.info(f"Parsed {len(df)} records from XML")
-                                return df
-                            except Exception:
-                                pass
-
-                            # Try pipe-delimited
-                            try:
-                                df = pd.read_csv(io.BytesIO(content), delimiter='|', low_memory=False)
-                                logger.info(f"Parsed {len(df)} records from pipe-delimited file")
-                                return df
-                            except Exception as e:
-                                logger.error(f"Failed to parse {opportunities_file}: {e}")
-
+                logger.info(f"Successfully downloaded {url}")
+                return response
             elif response.status_code == 404:
-                logger.info(f"Extract not found for {target_date.strftime('%Y-%m-%d')}, trying previous day...")
+                logger.info(f"Extract not found at {url}, trying previous day...")
             else:
                 logger.warning(f"HTTP {response.status_code} for {url}")
 
@@ -313,86 +380,272 @@ def download_grants_extract(max_attempts: int = MAX_LOOKBACK_DAYS) -> pd.DataFra
         except Exception as e:
             logger.error(f"Error downloading {url}: {e}")
 
-        # Try previous day
-        target_date -= timedelta(days=1)
+    logger.warning(f"Could not download grants extract from the last {max_attempts} days")
+    return None
+
+
+def find_opportunities_file(file_list: list):
+    """Pick the opportunities data file from the names in an extract archive."""
+    for filename in file_list:
+        if 'opportunit' in filename.lower():
+            return filename
+
+    for filename in file_list:
+        if filename.endswith('.csv') or filename.endswith('.xml'):
+            return filename
+
+    return file_list[0] if file_list else None
 
-    logger.warning(f"Could not download grants extract after {max_attempts} attempts")
-    return pd.DataFrame()
+
+def sniff_extract_format(head: bytes):
+    """
+    Detect the format of an opportunities file from its first bytes.
+    Returns ('xml', None) or ('csv', delimiter).
+    """
+    text = head.decode('utf-8', errors='ignore').lstrip('\ufeff \t\r\n')
+    if text.startswith('<'):
+        return 'xml', None
+
+    header = text.split('\n', 1)[0]
+    delimiter = '|' if header.count('|') > header.count(',') else ','
+    return 'csv', delimiter
+
+
+def _local_name(tag: str) -> str:
+    """Strip the namespace from an XML tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_xml_records(f, fields: set = None):
+    """
+    Stream the records of an opportunities XML file.
+    Each child of the root element is one record; its attributes and the
+    text of its child elements become the record's fields, with repeated
+    elements joined by REPEATED_FIELD_SEPARATOR. If `fields` is given,
+    only those (lowercased) names are kept.
+    """
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1:
+            record = {_local_name(key): value for key, value in elem.attrib.items()}
+            for child in elem:
+                name = _local_name(child.tag)
+                if fields is None or name.lower() in fields:
+                    value = child.text.strip() if child.text else None
+                    previous = record.get(name)
+                    if previous and value:
+                        value = f"{previous}{REPEATED_FIELD_SEPARATOR}{value}"
+                    record[name] = value or previous
+            if fields is not None:
+                record = {key: value for key, value in record.items() if key.lower() in fields}
+            yield record
+            # Drop parsed records so memory stays flat
+            root.clear()
+
+
+def term_columns(columns) -> dict:
+    """
+    Columns searched for each kind of term among the available `columns`:
+    the first CFDA column, every agency column, and the first title and the
+    first description column. Shared by the filters and match_grant_terms.
+    """
+    def first(candidates):
+        return [col for col in candidates if col in columns][:1]
+
+    return {
+        'cfda': first(CFDA_COLUMNS),
+        'agency': [col for col in AGENCY_COLUMNS if col in columns],
+        'keyword': first(TITLE_COLUMNS) + first(DESCRIPTION_COLUMNS),
+    }
+
+
+def match_grant_terms(record: dict, columns: dict = None) -> dict:
+    """
+    Find the safety terms in a single record.
+    Returns {'cfda': [...], 'agency': [...], 'keyword': [...]}, searching
+    `columns` from term_columns() (by default, chosen from the record's own fields).
+    """
+    columns = columns or term_columns(record)
+    matches = {}
+    for kind, matcher in TERM_MATCHERS.items():
+        terms = []
+        for col in columns[kind]:
+            for term in matcher.find_all(record.get(col)):
+                if term not in terms:
+                    terms.append(term)
+        matches[kind] = terms
+    return matches
+
+
+def relevance_score(matches: dict) -> int:
+    """Score a grant by the distinct safety terms it matched."""
+    return sum(RELEVANCE_WEIGHTS[kind] * len(terms) for kind, terms in matches.items())
+
+
+def format_matched_terms(matches: dict) -> str:
+    """Explain a match as pipe-separated kind:term pairs, e.g. 'cfda:20.600|keyword:vision zero'."""
+    return '|'.join(f"{kind}:{term}" for kind, terms in matches.items() for term in terms)
+
+
+def annotate_grant_terms(df: pd.DataFrame) -> pd.DataFrame:
+    """Add relevance_score and matched_terms columns to a frame of Grants.gov records."""
+    df = df.copy()
+    columns = term_columns(df.columns)
+    matches = [match_grant_terms(record, columns) for record in df.to_dict('records')]
+    df['relevance_score'] = [relevance_score(m) for m in matches]
+    df['matched_terms'] = [format_matched_terms(m) for m in matches]
+    return df
+
+
+def iter_xml_frames(f, chunk_rows: int = EXTRACT_CHUNK_ROWS, relevant_only: bool = False, stats: dict = None):
+    """
+    Yield an opportunities XML file as DataFrames of up to chunk_rows records.
+    With relevant_only, only the needed fields are kept and each chunk is
+    filtered with filter_grants, exactly like a CSV chunk.
+    """
+    fields = EXTRACT_FIELDS if relevant_only else None
+    records = []
+    for record in iter_xml_records(f, fields):
+        records.append(record)
+        if len(records) >= chunk_rows:
+            yield _xml_chunk(records, relevant_only, stats)
+            records = []
+    if records:
+        yield _xml_chunk(records, relevant_only, stats)
+
+
+def _xml_chunk(records: list, relevant_only: bool, stats: dict) -> pd.DataFrame:
+    chunk = pd.DataFrame(records)
+    if stats is not None:
+        stats['parsed'] += len(chunk)
+    return filter_grants(chunk) if relevant_only else chunk
+
+
+def iter_csv_frames(f, delimiter: str, chunk_rows: int = EXTRACT_CHUNK_ROWS,
+                    relevant_only: bool = False, stats: dict = None):
+    """
+    Yield an opportunities CSV file as DataFrames of up to chunk_rows rows.
+    With relevant_only, only the needed columns are read and each chunk is filtered.
+    """
+    usecols = (lambda col: col.strip().lower() in EXTRACT_FIELDS) if relevant_only else None
+    for chunk in pd.read_csv(f, delimiter=delimiter, dtype=str, chunksize=chunk_rows, usecols=usecols):
+        if stats is not None:
+            stats['parsed'] += len(chunk)
+        yield filter_grants(chunk) if relevant_only else chunk
+
+
+def iter_grants_extract(response, chunk_rows: int = EXTRACT_CHUNK_ROWS, relevant_only: bool = False,
+                        stats: dict = None):
+    """
+    Stream the opportunities in a downloaded Grants.gov extract as DataFrame chunks.
+    The archive is read from the cached file on disk, its format is sniffed
+    once from the first bytes, and records are parsed incrementally.
+    CSV values are kept as strings so every chunk has the same dtypes.
+    With relevant_only, non-matching grants are dropped during parsing and only
+    the columns used downstream are kept; `stats['parsed']` counts all records.
+    """
+    with zipfile.ZipFile(response.path) as zf:
+        file_list = zf.namelist()
+        logger.info(f"Files in archive: {file_list}")
+
+        opportunities_file = find_opportunities_file(file_list)
+        if opportunities_file is None:
+            return
+
+        with zf.open(opportunities_file) as f:
+            extract_format, delimiter = sniff_extract_format(f.read(SNIFF_BYTES))
+        logger.info(f"Reading file: {opportunities_file} ({extract_format})")
+
+        with zf.open(opportunities_file) as f:
+            if extract_format == 'xml':
+                yield from iter_xml_frames(f, chunk_rows, relevant_only, stats)
+            else:
+                yield from iter_csv_frames(f, delimiter, chunk_rows, relevant_only, stats)
+
+
+def parse_grants_extract(response) -> pd.DataFrame:
+    """Extract and parse the opportunities file from a downloaded Grants.gov extract."""
+    frames = list(iter_grants_extract(response))
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    logger.info(f"Parsed {len(df)} records")
+    return df
+
+
+def download_grants_extract(max_attempts: int = MAX_LOOKBACK_DAYS) -> pd.DataFrame:
+    """
+    Download and extract Grants.gov data.
+    Tries today's extract first, then looks back up to max_attempts days.
+    """
+    response = find_grants_extract(max_attempts)
+    if response is None:
+        return pd.DataFrame()
+
+    try:
+        return parse_grants_extract(response)
+    except Exception as e:
+        logger.error(f"Error extracting {response.url}: {e}")
+        return pd.DataFrame()
+
+
+def filter_grants_extract(response) -> tuple:
+    """
+    Parse a downloaded extract, keeping only relevant grants as they are parsed.
+    Returns (relevant grants DataFrame, total number of records parsed).
+    """
+    stats = {'parsed': 0}
+    kept = [chunk for chunk in iter_grants_extract(response, relevant_only=True, stats=stats) if not chunk.empty]
+
+    if not kept:
+        return pd.DataFrame(), stats['parsed']
+    return pd.concat(kept, ignore_index=True), stats['parsed']
 
 
 def filter_by_cfda(df: pd.DataFrame) -> pd.Series:
     """Filter for traffic safety CFDA numbers."""
-    cfda_columns = [
-        'CFDANumbers', 'CFDA_Numbers', 'cfda_numbers', 'CfdaNumber',
-        'CFDANumber', 'CFDA', 'cfda'
-    ]
+    mask = pd.Series(False, index=df.index)
 
-    cfda_col = None
+    cfda_columns = term_columns(df.columns)['cfda']
+    if not cfda_columns:
+        logger.warning("Could not find CFDA column")
     for col in cfda_columns:
-        if col in df.columns:
-            cfda_col = col
-            break
+        mask |= df[col].map(CFDA_MATCHER.search).astype(bool)
+        logger.info(f"Found {mask.sum()} grants matching safety CFDA numbers in {col}")
 
-    if cfda_col:
-        # Create pattern for CFDA matching
-        cfda_pattern = '|'.join([re.escape(cfda) for cfda in SAFETY_CFDA_NUMBERS])
-        mask = df[cfda_col].astype(str).str.contains(cfda_pattern, na=False, regex=True)
-        logger.info(f"Found {mask.sum()} grants matching safety CFDA numbers in {cfda_col}")
-        return mask
-    else:
-        logger.warning("Could not find CFDA column")
-        return pd.Series([False] * len(df))
+    return mask
 
 
 def filter_by_agency(df: pd.DataFrame) -> pd.Series:
     """Filter for relevant safety agencies."""
-    agency_columns = [
-        'AgencyName', 'Agency', 'agency_name', 'AGENCY_NAME',
-        'GrantorContactName', 'FundingAgency', 'AgencyCode'
-    ]
+    mask = pd.Series(False, index=df.index)
 
-    mask = pd.Series([False] * len(df))
-    agency_pattern = '|'.join([re.escape(a) for a in SAFETY_AGENCIES])
-
-    for col in agency_columns:
-        if col in df.columns:
-            col_mask = df[col].astype(str).str.contains(agency_pattern, na=False, case=False, regex=True)
-            mask |= col_mask
-            logger.info(f"Found {col_mask.sum()} agency matches in {col}")
+    for col in term_columns(df.columns)['agency']:
+        col_mask = df[col].map(AGENCY_MATCHER.search).astype(bool)
+        mask |= col_mask
+        logger.info(f"Found {col_mask.sum()} agency matches in {col}")
 
     return mask
 
 
 def filter_by_keywords(df: pd.DataFrame) -> pd.Series:
     """Filter for traffic safety related keywords in title and description."""
-    keyword_pattern = '|'.join([re.escape(kw) for kw in SAFETY_KEYWORDS])
-    mask = pd.Series([False] * len(df))
-
-    # Check title columns
-    title_columns = [
-        'OpportunityTitle', 'Title', 'opportunity_title',
-        'OPPORTUNITY_TITLE', 'Grant_Title', 'ProjectTitle'
-    ]
+    mask = pd.Series(False, index=df.index)
 
-    for col in title_columns:
-        if col in df.columns:
-            col_mask = df[col].astype(str).str.lower().str.contains(keyword_pattern, na=False, regex=True)
-            mask |= col_mask
-            logger.info(f"Found {col_mask.sum()} keyword matches in {col}")
-            break
-
-    # Check description columns
-    desc_columns = [
-        'Description', 'OpportunityDescription', 'description',
-        'DESCRIPTION', 'Synopsis', 'Abstract', 'Summary'
-    ]
-
-    for col in desc_columns:
-        if col in df.columns:
-            col_mask = df[col].astype(str).str.lower().str.contains(keyword_pattern, na=False, regex=True)
-            mask |= col_mask
-            logger.info(f"Found {col_mask.sum()} keyword matches in {col}")
-            break
+    # First title column and first description column
+    for col in term_columns(df.columns)['keyword']:
+        col_mask = df[col].map(KEYWORD_MATCHER.search).astype(bool)
+        mask |= col_mask
+        logger.info(f"Found {col_mask.sum()} keyword matches in {col}")
 
     return mask
 
@@ -404,33 +657,43 @@ def filter_grants(df: pd.DataFrame) -> pd.DataFrame:
     # Priority: CFDA > Agency > Keywords
     cfda_mask = filter_by_cfda(df)
     agency_mask = filter_by_agency(df)
-    keyword_mask = filter_by_keywords(df)
+    # Keywords only decide grants from a safety agency without a safety CFDA number,
+    # so the long description text of every other grant is never scanned
+    keyword_candidates = agency_mask & ~cfda_mask
+    keyword_mask = filter_by_keywords(df[keyword_candidates]).reindex(df.index, fill_value=False)
 
     # Combine: CFDA OR (Agency AND Keywords)
     combined_mask = cfda_mask | (agency_mask & keyword_mask)
 
-    df_filtered = df[combined_mask].copy()
+    df_filtered = annotate_grant_terms(df[combined_mask])
     logger.info(f"Filtered from {original_count} to {len(df_filtered)} relevant grants")
 
     return df_filtered
 
 
+def parse_grant_dates(values: pd.Series) -> pd.Series:
+    """Parse grant dates, including the MMDDYYYY form used by the Grants.gov extract."""
+    text = values.astype('string').str.strip()
+    compact = text.str.fullmatch(r'\d{8}').fillna(False).astype(bool)
+
+    dates = pd.to_datetime(text.where(compact), format='%m%d%Y', errors='coerce')
+    other = ~compact & text.notna()
+    if other.any():
+        dates[other] = pd.to_datetime(text[other], errors='coerce', format='mixed')
+    return dates
+
+
 def filter_active_grants(df: pd.DataFrame) -> pd.DataFrame:
     """Filter to only include grants that are still open or recently closed."""
-    date_columns = [
-        'CloseDate', 'close_date', 'CLOSE_DATE', 'ApplicationDueDate',
-        'DueDate', 'Deadline', 'ResponseDate'
-    ]
-
     date_col = None
-    for col in date_columns:
+    for col in CLOSE_DATE_COLUMNS:
         if col in df.columns:
             date_col = col
             break
 
     if date_col:
         try:
-            df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+            df[date_col] = parse_grant_dates(df[date_col])
             cutoff_date = datetime.now() - timedelta(days=30)
             mask = (df[date_col].isna()) | (df[date_col] >= cutoff_date)
             df_filtered = df[mask].copy()
@@ -444,26 +707,9 @@ def filter_active_grants(df: pd.DataFrame) -> pd.DataFrame:
 
 def map_to_output_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Map Grants.gov columns to our standard output format."""
-    column_mappings = {
-        # Source column -> Output column
-        'OpportunityID': 'grant_id',
-        'OpportunityNumber': 'grant_id',
-        'OpportunityTitle': 'title',
-        'AgencyName': 'agency',
-        'CFDANumbers': 'cfda_number',
-        'Description': 'description',
-        'Synopsis': 'description',
-        'CloseDate': 'close_date',
-        'PostDate': 'post_date',
-        'AwardCeiling': 'award_ceiling',
-        'AwardFloor': 'award_floor',
-        'AdditionalInformationURL': 'application_url',
-        'GrantorContactEmail': 'contact_info',
-    }
-
     output_data = {}
 
-    for orig_col, new_col in column_mappings.items():
+    for orig_col, new_col in OUTPUT_COLUMN_MAPPINGS.items():
         if orig_col in df.columns and new_col not in output_data:
             output_data[new_col] = df[orig_col]
         else:
@@ -495,8 +741,20 @@ def map_to_output_columns(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def get_virginia_static_grants() -> pd.DataFrame:
-    """Get the static Virginia grants as a DataFrame."""
-    return pd.DataFrame(VIRGINIA_STATIC_GRANTS)
+    """Get the static Virginia grants as a DataFrame, scored like the federal grants."""
+    df = pd.DataFrame(VIRGINIA_STATIC_GRANTS)
+    matches = [
+        match_grant_terms({
+            'CFDANumbers': grant['cfda_number'],
+            'AgencyName': grant['agency'],
+            'OpportunityTitle': grant['title'],
+            'Description': grant['description'],
+        })
+        for grant in VIRGINIA_STATIC_GRANTS
+    ]
+    df['relevance_score'] = [relevance_score(m) for m in matches]
+    df['matched_terms'] = [format_matched_terms(m) for m in matches]
+    return df
 
 
 def main():
@@ -514,23 +772,25 @@ def main():
 
     # Try to download federal grants from Grants.gov
     federal_grants = pd.DataFrame()
+    # Extract dates are probed concurrently, one connection each
+    http_client.configure_session(pool_size=MAX_LOOKBACK_DAYS)
 
     try:
-        df = download_grants_extract()
+        # An unchanged extract is revalidated, not downloaded again. The output is still
+        # rebuilt every run: active-grant filtering and last_updated depend on today's date.
+        response = find_grants_extract()
 
-        if not df.empty:
-            logger.info(f"Downloaded {len(df)} total grants from Grants.gov")
-
-            # Filter for traffic safety related grants
-            df = filter_grants(df)
+        # Filter for traffic safety related grants while the extract is parsed
+        df, total = filter_grants_extract(response) if response is not None else (pd.DataFrame(), 0)
+        logger.info(f"Downloaded {total} total grants from Grants.gov, {len(df)} relevant")
 
-            if not df.empty:
-                # Filter to active grants
-                df = filter_active_grants(df)
+        if not df.empty:
+            # Filter to active grants
+            df = filter_active_grants(df)
 
-                # Map to output columns
-                federal_grants = map_to_output_columns(df)
-                logger.info(f"Processed {len(federal_grants)} federal grants")
+            # Map to output columns
+            federal_grants = map_to_output_columns(df)
+            logger.info(f"Processed {len(federal_grants)} federal grants")
 
     except Exception as e:
         logger.warning(f"Could not download federal grants: {e}")
@@ -544,7 +804,8 @@ def main():
             'close_date', 'post_date', 'federal_share_pct', 'award_ceiling',
             'award_floor', 'emphasis_areas', 'eligible_activities',
             'requires_crash_data', 'application_url', 'contact_info',
-            'status', 'virginia_specific', 'description'
+            'status', 'virginia_specific', 'description', 'relevance_score',
+            'matched_terms'
         ]
 
         for col in all_columns:
@@ -0,0 +1,339 @@
+"""
+Shared HTTP helpers for the data download scripts.
+Provides a pooled keep-alive session with a retry policy, and an on-disk
+cache with ETag/Last-Modified revalidation so unchanged upstream files are
+not downloaded or processed again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "http")
+CACHE_INDEX = os.path.join(CACHE_DIR, "index.json")
+CACHE_BODY_DIR = os.path.join(CACHE_DIR, "bodies")
+# Input fingerprints live with the outputs they describe rather than in the cache:
+# the scheduled workflow commits data/ but starts every run with an empty cache
+FINGERPRINT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "input_fingerprints.json")
+
+# Least recently used bodies are evicted once the cache grows past this size
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+# Response bodies are streamed to disk in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+
+# Connection pool size per host; raise to match the download concurrency
+POOL_SIZE = 4
+
+# Seconds to wait for a connection; read timeouts are passed per request
+CONNECT_TIMEOUT = 15
+
+# Transport-level retries on throttling and server errors (honours Retry-After).
+# Kept short: callers such as the ArcGIS page loop add their own slower retries.
+RETRY_TOTAL = 2
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Per-host overrides of the retry policy: {'https://host': {'total': ..., 'backoff': ...}}
+HOST_RETRIES = {}
+
+_lock = threading.Lock()
+_session = None
+_index = None
+_served_digests = []
+
+
+class CachedResponse:
+    """
+    Response served through the cache. Successful bodies live on disk at
+    `path`; `from_cache` is True when the server answered 304 Not Modified.
+    """
+
+    def __init__(self, url: str, status_code: int, headers: dict, path: str = None,
+                 digest: str = None, from_cache: bool = False, content: bytes = b''):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.path = path
+        self.digest = digest
+        self.from_cache = from_cache
+        self._content = content
+
+    def raise_for_status(self) -> None:
+        """Raise requests.HTTPError for 4xx/5xx responses."""
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code} for {self.url}", response=self)
+
+    @property
+    def content(self) -> bytes:
+        """The whole response body. Prefer open() for large bodies."""
+        if self.path is None:
+            return self._content
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def open(self):
+        """Open the cached response body as a binary file."""
+        return open(self.path, 'rb')
+
+    def json(self):
+        """Parse the response body as JSON."""
+        if self.path is None:
+            return json.loads(self._content)
+        with open(self.path, 'rb') as f:
+            return json.load(f)
+
+
+def _retry_policy(total: int, backoff: float) -> Retry:
+    """Build the urllib3 retry policy for the session adapters."""
+    return Retry(
+        total=total,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+def create_session(pool_size: int = None) -> requests.Session:
+    """
+    Create a keep-alive session with connection pooling, gzip negotiation
+    and the retry policy. Hosts listed in HOST_RETRIES get their own policy.
+    """
+    pool_size = max(pool_size or POOL_SIZE, 1)
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=_retry_policy(RETRY_TOTAL, RETRY_BACKOFF))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    for prefix, policy in HOST_RETRIES.items():
+        retry = _retry_policy(policy.get('total', RETRY_TOTAL), policy.get('backoff', RETRY_BACKOFF))
+        session.mount(prefix, HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry))
+
+    return session
+
+
+def configure_session(pool_size: int = None) -> requests.Session:
+    """Replace the shared session, e.g. to size its pool to the number of download workers."""
+    global _session
+    session = create_session(pool_size)
+    with _lock:
+        old, _session = _session, session
+    if old is not None:
+        old.close()
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the shared session, creating it on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def request_timeout(timeout) -> tuple:
+    """Split a timeout into (connect, read); a number is taken as the read timeout."""
+    if isinstance(timeout, tuple):
+        return timeout
+    return (min(CONNECT_TIMEOUT, timeout), timeout)
+
+
+def cache_key(url: str, params: dict = None) -> str:
+    """Build the cache key for a URL and its query parameters."""
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return hashlib.sha256(json.dumps([url, items]).encode('utf-8')).hexdigest()
+
+
+def _load_index() -> dict:
+    """Load the cache index from disk (once per process). Caller holds _lock."""
+    global _index
+    if _index is None:
+        _index = {}
+        if os.path.exists(CACHE_INDEX):
+            try:
+                with open(CACHE_INDEX) as f:
+                    _index = json.load(f)
+            except ValueError as e:
+                logger.warning(f"Discarding unreadable HTTP cache index: {e}")
+    return _index
+
+
+def _save_index() -> None:
+    """Atomically write the cache index. Caller holds _lock."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = CACHE_INDEX + f".{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(_index, f)
+    os.replace(tmp_path, CACHE_INDEX)
+
+
+def _evict(keep_key: str) -> None:
+    """Evict least recently used bodies until the cache fits MAX_CACHE_BYTES. Caller holds _lock."""
+    total = sum(entry['size'] for entry in _index.values())
+    for key, entry in sorted(_index.items(), key=lambda item: item[1]['accessed']):
+        if total <= MAX_CACHE_BYTES:
+            break
+        if key == keep_key:
+            continue
+        body_path = os.path.join(CACHE_BODY_DIR, key)
+        if os.path.exists(body_path):
+            os.remove(body_path)
+        total -= entry['size']
+        del _index[key]
+        logger.debug(f"Evicted {entry['url']} from HTTP cache")
+
+
+def _record_served(digest: str) -> None:
+    """Remember a body served in this process for fingerprint()."""
+    with _lock:
+        _served_digests.append(digest)
+
+
+def cached_get(url: str, params: dict = None, timeout=60) -> CachedResponse:
+    """
+    GET a URL through the on-disk cache.
+    A cached body is revalidated with If-None-Match / If-Modified-Since and
+    reused on 304. New bodies are streamed to disk and hashed as they arrive.
+    Error responses are returned uncached; call raise_for_status() to check.
+    `timeout` is the read timeout, or a (connect, read) tuple.
+    """
+    return _cached_request('GET', url, params, timeout)
+
+
+def cached_post(url: str, data: dict = None, timeout=60) -> CachedResponse:
+    """
+    POST form data to a URL through the on-disk cache, for read-only queries
+    whose parameters are too long for a GET URL. Bodies are cached and
+    revalidated like cached_get(), under the same key as the equivalent GET.
+    """
+    return _cached_request('POST', url, data, timeout)
+
+
+def _cached_request(method: str, url: str, params: dict, timeout) -> CachedResponse:
+    """Send a GET (params in the URL) or POST (params as a form) through the cache."""
+    key = cache_key(url, params)
+    body_path = os.path.join(CACHE_BODY_DIR, key)
+
+    with _lock:
+        entry = _load_index().get(key)
+    if entry is not None and not os.path.exists(body_path):
+        entry = None
+
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    if method == 'POST':
+        request_args = {'data': params}
+    else:
+        request_args = {'params': params}
+
+    with get_session().request(method, url, headers=headers, timeout=request_timeout(timeout),
+                               stream=True, **request_args) as response:
+        if response.status_code == 304 and entry is not None:
+            with _lock:
+                entry['accessed'] = time.time()
+                _save_index()
+            _record_served(entry['digest'])
+            logger.debug(f"Not modified, using cached body for {response.url}")
+            return CachedResponse(response.url, 200, dict(response.headers), body_path, entry['digest'], True)
+
+        if response.status_code != 200:
+            return CachedResponse(response.url, response.status_code, dict(response.headers), content=response.content)
+
+        # Stream the body to a temporary file, hashing it on the way
+        os.makedirs(CACHE_BODY_DIR, exist_ok=True)
+        tmp_path = body_path + f".{threading.get_ident()}.tmp"
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                sha256.update(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, body_path)
+
+        digest = sha256.hexdigest()
+        with _lock:
+            _index[key] = {
+                'url': response.url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'digest': digest,
+                'size': size,
+                'accessed': time.time(),
+            }
+            _evict(key)
+            _save_index()
+
+        _record_served(digest)
+        return CachedResponse(response.url, 200, dict(response.headers), body_path, digest)
+
+
+def reset_fingerprint() -> None:
+    """Forget the bodies served so far in this process."""
+    with _lock:
+        _served_digests.clear()
+
+
+def fingerprint(extra_files: list = ()) -> str:
+    """
+    Hash every body served since reset_fingerprint(), plus the given files
+    (typically the calling script, so code changes also count as new input).
+    Bodies are hashed in sorted order, so concurrent fetch order does not matter.
+    """
+    sha256 = hashlib.sha256()
+    with _lock:
+        digests = sorted(_served_digests)
+    for digest in digests:
+        sha256.update(digest.encode('ascii'))
+    for path in extra_files:
+        with open(path, 'rb') as f:
+            sha256.update(hashlib.sha256(f.read()).hexdigest().encode('ascii'))
+    return sha256.hexdigest()
+
+
+def _load_fingerprints() -> dict:
+    """Load the fingerprints recorded by earlier runs."""
+    if not os.path.exists(FINGERPRINT_FILE):
+        return {}
+    try:
+        with open(FINGERPRINT_FILE) as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def inputs_unchanged(name: str, current: str) -> bool:
+    """Check whether `current` matches the fingerprint recorded for `name` by the last run."""
+    return _load_fingerprints().get(name) == current
+
+
+def record_inputs(name: str, current: str) -> None:
+    """Record the input fingerprint of a successful run."""
+    fingerprints = _load_fingerprints()
+    fingerprints[name] = current
+    os.makedirs(os.path.dirname(FINGERPRINT_FILE), exist_ok=True)
+    tmp_path = FINGERPRINT_FILE + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(fingerprints, f, indent=2)
+    os.replace(tmp_path, FINGERPRINT_FILE)
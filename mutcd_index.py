@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+Build and query lookup artifacts for the Virginia MUTCD sections.
+The search index maps stemmed terms to the sections that contain them and
+ranks matches with BM25; the section store packs every section into one
+file that can be read a section at a time without parsing the part files;
+the pattern table resolves crash patterns, signal warrants and common
+queries from keyword_search_index.json to ranked sections ahead of time.
+"""
+
+import argparse
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from collections import Counter
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Input configuration
+MUTCD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "va_mutcd")
+KEYWORD_INDEX_FILE = os.path.join(MUTCD_DIR, "keyword_search_index.json")
+
+# Output configuration
+SEARCH_INDEX_FILE = os.path.join(MUTCD_DIR, "search_index.json")
+SECTION_STORE_FILE = os.path.join(MUTCD_DIR, "sections.pack")
+PATTERN_SECTIONS_FILE = os.path.join(MUTCD_DIR, "crash_pattern_sections.json")
+
+# Section store layout: magic, table length (uint32, little-endian), JSON offset
+# table {section_number: [offset, length]}, then one zlib-compressed JSON record per section
+SECTION_STORE_MAGIC = b'MUTCDPK1'
+SECTION_STORE_HEADER = struct.Struct('<8sI')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Title terms count this many times toward a section's term frequencies
+TITLE_WEIGHT = 3
+
+# Sections listed per crash pattern: explicit references first, then the best
+# search matches within the pattern's chapters
+PATTERN_SECTION_LIMIT = 10
+
+# Maximum length of the excerpt shown for each resolved section
+EXCERPT_CHARS = 280
+
+SECTION_NUMBER_PATTERN = re.compile(r'^\d[A-Z]\.\d+$')
+
+# Common words that carry no meaning for search
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'if',
+    'in', 'into', 'is', 'it', 'its', 'not', 'of', 'on', 'or', 'such', 'than', 'that',
+    'the', 'their', 'then', 'there', 'these', 'this', 'those', 'to', 'was', 'were',
+    'which', 'with', 'within',
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+_search_index = None
+_section_store = None
+_pattern_sections = None
+
+
+def _measure(stem: str) -> int:
+    """Count vowel-consonant sequences in a stem (Porter's m)."""
+    forms = ''.join('v' if _is_vowel(stem, i) else 'c' for i in range(len(stem)))
+    return len(re.findall(r'v+c+', forms))
+
+
+def _is_vowel(word: str, i: int) -> bool:
+    """Check whether word[i] acts as a vowel; y is a vowel after a consonant."""
+    ch = word[i]
+    if ch in 'aeiou':
+        return True
+    return ch == 'y' and i > 0 and not _is_vowel(word, i - 1)
+
+
+def _has_vowel(stem: str) -> bool:
+    """Check whether a stem contains a vowel."""
+    return any(_is_vowel(stem, i) for i in range(len(stem)))
+
+
+def _ends_cvc(stem: str) -> bool:
+    """Check for a consonant-vowel-consonant ending where the last consonant is not w, x or y."""
+    n = len(stem)
+    if n < 3 or stem[-1] in 'wxy':
+        return False
+    return not _is_vowel(stem, n - 3) and _is_vowel(stem, n - 2) and not _is_vowel(stem, n - 1)
+
+
+def stem(word: str) -> str:
+    """
+    Reduce a lowercase word to its stem with steps 1 and 5b of the Porter
+    stemmer (plurals, -ed and -ing), e.g. signals -> signal, timing -> time.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+
+    # Step 1a: plurals
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss') and not word.endswith('us'):
+        word = word[:-1]
+
+    # Step 1b: -eed, -ed, -ing
+    if word.endswith('eed'):
+        if _measure(word[:-3]) > 0:
+            word = word[:-1]
+    else:
+        for suffix in ('ed', 'ing'):
+            if word.endswith(suffix) and _has_vowel(word[:-len(suffix)]):
+                word = word[:-len(suffix)]
+                if word.endswith(('at', 'bl', 'iz')):
+                    word += 'e'
+                elif (len(word) > 1 and word[-1] == word[-2] and word[-1] not in 'lsz'
+                      and not _is_vowel(word, len(word) - 1)):
+                    word = word[:-1]
+                elif _measure(word) == 1 and _ends_cvc(word):
+                    word += 'e'
+                break
+
+    # Step 1c: trailing y
+    if word.endswith('y') and _has_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+
+    # Step 5b: controll -> control
+    if word.endswith('ll') and _measure(word[:-1]) > 1:
+        word = word[:-1]
+
+    return word
+
+
+def tokenize(text: str) -> list:
+    """Split text into lowercase, stemmed terms, dropping stopwords."""
+    if not text:
+        return []
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _is_heading(title: str) -> bool:
+    """Check whether an extracted section title looks like a real heading, not a text fragment."""
+    return bool(title) and title[0].isupper()
+
+
+def load_mutcd_sections(mutcd_dir: str = None) -> list:
+    """
+    Load every section from the MUTCD part files, in document order.
+    The PDF extraction splits some sections into several fragments sharing
+    one section_number; these are merged into a single section whose title
+    is taken from the first fragment that looks like a heading.
+    """
+    mutcd_dir = mutcd_dir or MUTCD_DIR
+    with open(os.path.join(mutcd_dir, "index.json")) as f:
+        mutcd_index = json.load(f)
+
+    sections = {}
+    for part in mutcd_index['parts']:
+        with open(os.path.join(mutcd_dir, part['filename'])) as f:
+            part_data = json.load(f)
+
+        for chapter in part_data['chapters']:
+            for fragment in chapter['sections']:
+                number = fragment['section_number']
+                section = sections.get(number)
+                if section is None:
+                    sections[number] = {
+                        'section_number': number,
+                        'chapter_code': chapter['chapter_code'],
+                        'part_id': part['part_id'],
+                        'title': fragment['title'],
+                        'virginia_specific': fragment.get('virginia_specific', False),
+                        'content': {kind: list(items) for kind, items in fragment.get('content', {}).items()},
+                        'raw_text': fragment['raw_text'],
+                    }
+                    continue
+
+                if not _is_heading(section['title']) and _is_heading(fragment['title']):
+                    section['title'] = fragment['title']
+                section['virginia_specific'] = section['virginia_specific'] or fragment.get('virginia_specific', False)
+                for kind, items in fragment.get('content', {}).items():
+                    section['content'].setdefault(kind, []).extend(items)
+                section['raw_text'] += '\n' + fragment['raw_text']
+
+    return list(sections.values())
+
+
+def build_search_index(sections: list) -> dict:
+    """
+    Build the inverted index for a list of sections.
+    Postings are stored per term as a flat [doc, tf, doc, tf, ...] list, where
+    doc indexes into `docs` ([section_number, chapter_code, part_id, title, length]).
+    """
+    docs = []
+    postings = {}
+
+    for doc_id, section in enumerate(sections):
+        terms = Counter(tokenize(section['raw_text']))
+        for term in tokenize(section['title']):
+            terms[term] += TITLE_WEIGHT
+
+        length = sum(terms.values())
+        docs.append([section['section_number'], section['chapter_code'], section['part_id'],
+                     section['title'], length])
+        for term, tf in terms.items():
+            postings.setdefault(term, []).extend((doc_id, tf))
+
+    avgdl = sum(doc[4] for doc in docs) / len(docs) if docs else 0.0
+    return {
+        'k1': BM25_K1,
+        'b': BM25_B,
+        'avgdl': avgdl,
+        'docs': docs,
+        'postings': dict(sorted(postings.items())),
+    }
+
+
+class SearchIndex:
+    """BM25 search over a built MUTCD index."""
+
+    def __init__(self, data: dict):
+        self.docs = data['docs']
+        self.postings = data['postings']
+        self.k1 = data['k1']
+        self.b = data['b']
+        self.avgdl = data['avgdl'] or 1.0
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency of a term (BM25 form, never negative)."""
+        df = len(self.postings.get(term, ())) // 2
+        n = len(self.docs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def score(self, query: str) -> dict:
+        """Return {doc_id: BM25 score} for every section matching at least one query term."""
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf(term)
+            for i in range(0, len(plist), 2):
+                doc_id, tf = plist[i], plist[i + 1]
+                norm = self.k1 * (1 - self.b + self.b * self.docs[doc_id][4] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, limit: int = 10, chapters: list = None) -> list:
+        """
+        Find the sections most relevant to a query, best first.
+        `chapters` restricts results to the given chapter codes (e.g. ['4C', '4D']).
+        """
+        scores = self.score(query)
+        if chapters:
+            chapters = set(chapters)
+            scores = {doc_id: s for doc_id, s in scores.items() if self.docs[doc_id][1] in chapters}
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        results = []
+        for doc_id, score in ranked:
+            section_number, chapter_code, part_id, title, _ = self.docs[doc_id]
+            results.append({
+                'section_number': section_number,
+                'chapter_code': chapter_code,
+                'part_id': part_id,
+                'title': title,
+                'score': round(score, 4),
+            })
+        return results
+
+
+def write_search_index(path: str = None, mutcd_dir: str = None) -> dict:
+    """Build the search index from the part files and write it as compact JSON."""
+    path = path or SEARCH_INDEX_FILE
+    sections = load_mutcd_sections(mutcd_dir)
+    data = build_search_index(sections)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+    logger.info(f"Indexed {len(data['docs'])} sections, {len(data['postings'])} terms -> {path} "
+                f"({os.path.getsize(path) / 1024:.0f} KB)")
+    return data
+
+
+def load_search_index(path: str = None) -> SearchIndex:
+    """Load the search index (once per process), building it in memory if the file is missing."""
+    global _search_index
+    path = path or SEARCH_INDEX_FILE
+    if _search_index is None or _search_index[0] != path:
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+        else:
+            logger.warning(f"{path} not found, building the search index in memory")
+            data = build_search_index(load_mutcd_sections())
+        _search_index = (path, SearchIndex(data))
+    return _search_index[1]
+
+
+def search_sections(query: str, limit: int = 10, chapters: list = None) -> list:
+    """Find the MUTCD sections most relevant to a query using the prebuilt index."""
+    return load_search_index().search(query, limit, chapters)
+
+
+def write_section_store(path: str = None, mutcd_dir: str = None) -> int:
+    """
+    Pack every section into a single file: an offset table keyed by section
+    number, followed by each section compressed on its own so it can be read
+    without decompressing the rest. Returns the number of sections written.
+    """
+    path = path or SECTION_STORE_FILE
+    sections = load_mutcd_sections(mutcd_dir)
+
+    table = {}
+    blobs = []
+    offset = 0
+    for section in sections:
+        blob = zlib.compress(json.dumps(section, separators=(',', ':')).encode('utf-8'), 9)
+        table[section['section_number']] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    table_bytes = json.dumps(table, separators=(',', ':')).encode('utf-8')
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SECTION_STORE_HEADER.pack(SECTION_STORE_MAGIC, len(table_bytes)))
+        f.write(table_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Packed {len(sections)} sections -> {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    return len(sections)
+
+
+class SectionStore:
+    """
+    Read-only access to a packed section store. The file is memory-mapped;
+    only the offset table is parsed up front and each lookup decompresses
+    just the requested section.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, table_length = SECTION_STORE_HEADER.unpack_from(self._mmap, 0)
+        if magic != SECTION_STORE_MAGIC:
+            raise ValueError(f"{path} is not a MUTCD section store")
+        table_start = SECTION_STORE_HEADER.size
+        self._table = json.loads(self._mmap[table_start:table_start + table_length])
+        self._data_start = table_start + table_length
+
+    def __contains__(self, section_number: str) -> bool:
+        return section_number in self._table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def section_numbers(self) -> list:
+        """Return every section number in document order."""
+        return list(self._table)
+
+    def get(self, section_number: str):
+        """Return one section (number, title, chapter, part, content, raw_text), or None if unknown."""
+        entry = self._table.get(section_number)
+        if entry is None:
+            return None
+        start = self._data_start + entry[0]
+        return json.loads(zlib.decompress(self._mmap[start:start + entry[1]]))
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+def open_section_store(path: str = None) -> SectionStore:
+    """Open the section store (once per process)."""
+    global _section_store
+    path = path or SECTION_STORE_FILE
+    if _section_store is None or _section_store.path != path:
+        _section_store = SectionStore(path)
+    return _section_store
+
+
+def get_section(section_number: str):
+    """Fetch a single MUTCD section, e.g. get_section('4C.01'), from the packed store."""
+    return open_section_store().get(section_number)
+
+
+def section_excerpt(section: dict, limit: int = EXCERPT_CHARS) -> str:
+    """
+    Summarise a section with its first Standard statement (or Guidance,
+    Support, Option, or raw text if it has none), cut at a word boundary.
+    """
+    text = section['raw_text']
+    for kind in ('standard', 'guidance', 'support', 'option'):
+        items = section.get('content', {}).get(kind)
+        if items:
+            text = items[0]
+            break
+
+    # Drop the leading paragraph number (e.g. '04 ') and collapse whitespace
+    text = re.sub(r'^\d{2}[a-z]?\s+', '', ' '.join(text.split()))
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+def _resolve_section(store: SectionStore, section_number: str, **extra):
+    """Look up a section and return its summary entry, or None if it is not in the store."""
+    section = store.get(section_number)
+    if section is None:
+        return None
+    entry = {
+        'section_number': section_number,
+        'title': section['title'],
+        'chapter_code': section['chapter_code'],
+        'part_id': section['part_id'],
+        'excerpt': section_excerpt(section),
+    }
+    entry.update(extra)
+    return entry
+
+
+def build_pattern_sections(keyword_index: dict, search_index: SearchIndex, store: SectionStore) -> dict:
+    """
+    Resolve keyword_search_index.json against the sections.
+    Crash patterns get their specific references (in the given order)
+    followed by the best BM25 matches for their keywords within their
+    chapters; signal warrants and common queries get their listed sections.
+    References that are not section numbers, or not in the manual, are
+    kept under 'unresolved'.
+    """
+    unresolved = []
+
+    crash_patterns = {}
+    for pattern, mapping in keyword_index.get('crash_pattern_mapping', {}).items():
+        sections = []
+        for reference in mapping.get('specific_references', []):
+            entry = _resolve_section(store, reference['section'], topic=reference.get('topic'), source='reference')
+            if entry is None:
+                unresolved.append({'pattern': pattern, 'section': reference['section']})
+            elif all(s['section_number'] != entry['section_number'] for s in sections):
+                sections.append(entry)
+
+        chapters = [code for code in mapping.get('relevant_sections', []) if not SECTION_NUMBER_PATTERN.match(code)]
+        query = ' '.join(mapping.get('keywords', []))
+        if chapters and query:
+            for result in search_index.search(query, PATTERN_SECTION_LIMIT, chapters):
+                if len(sections) >= PATTERN_SECTION_LIMIT:
+                    break
+                if any(s['section_number'] == result['section_number'] for s in sections):
+                    continue
+                sections.append(_resolve_section(store, result['section_number'], score=result['score'],
+                                                 source='search'))
+
+        resolved = {
+            'description': mapping.get('description'),
+            'chapters': mapping.get('relevant_sections', []),
+            'keywords': mapping.get('keywords', []),
+            'sections': sections,
+        }
+        for key in ('note', 'reference'):
+            if key in mapping:
+                resolved[key] = mapping[key]
+        crash_patterns[pattern] = resolved
+
+    signal_warrants = []
+    for warrant in keyword_index.get('signal_warrants', {}).get('warrants', []):
+        entry = _resolve_section(store, warrant['section'], warrant_number=warrant['number'],
+                                 warrant_name=warrant['name'])
+        if entry is None:
+            unresolved.append({'warrant': warrant['number'], 'section': warrant['section']})
+        else:
+            signal_warrants.append(entry)
+
+    common_queries = {}
+    for query, references in keyword_index.get('common_queries', {}).items():
+        sections = []
+        for reference in references:
+            entry = _resolve_section(store, reference) if SECTION_NUMBER_PATTERN.match(reference) else None
+            if entry is None:
+                unresolved.append({'query': query, 'section': reference})
+            else:
+                sections.append(entry)
+        common_queries[query] = sections
+
+    return {
+        'crash_patterns': crash_patterns,
+        'signal_warrants': signal_warrants,
+        'common_queries': common_queries,
+        'unresolved': unresolved,
+    }
+
+
+def write_pattern_sections(path: str = None) -> dict:
+    """Resolve keyword_search_index.json against the built search index and section store, and save it."""
+    path = path or PATTERN_SECTIONS_FILE
+    with open(KEYWORD_INDEX_FILE) as f:
+        keyword_index = json.load(f)
+
+    data = build_pattern_sections(keyword_index, load_search_index(), open_section_store())
+    for item in data['unresolved']:
+        logger.warning(f"Unresolved MUTCD reference: {item}")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Resolved {len(data['crash_patterns'])} crash patterns, {len(data['signal_warrants'])} warrants, "
+                f"{len(data['common_queries'])} common queries -> {path}")
+    return data
+
+
+def load_pattern_sections(path: str = None) -> dict:
+    """Load the resolved pattern table (once per process)."""
+    global _pattern_sections
+    path = path or PATTERN_SECTIONS_FILE
+    if _pattern_sections is None or _pattern_sections[0] != path:
+        with open(path) as f:
+            _pattern_sections = (path, json.load(f))
+    return _pattern_sections[1]
+
+
+def pattern_sections(pattern: str) -> list:
+    """Return the ranked MUTCD sections for a crash pattern, e.g. 'angle_crashes'."""
+    resolved = load_pattern_sections()['crash_patterns'].get(pattern)
+    return resolved['sections'] if resolved else []
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Build or query the Virginia MUTCD lookup artifacts.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('build', help="build the search index and section store from the MUTCD part files")
+
+    section_parser = subparsers.add_parser('section', help="print one section from the section store")
+    section_parser.add_argument('section_number', help="section number, e.g. 4C.01")
+
+    search_parser = subparsers.add_parser('search', help="search the index")
+    search_parser.add_argument('query', help="free-text query, e.g. 'left turn phase'")
+    search_parser.add_argument('--limit', type=int, default=10, help="number of results (default: 10)")
+    search_parser.add_argument('--chapter', action='append', dest='chapters',
+                               help="only return sections in this chapter code (repeatable)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main function to build or query the MUTCD lookup artifacts."""
+    args = parse_args(argv)
+
+    if args.command == 'build':
+        write_search_index()
+        write_section_store()
+        write_pattern_sections()
+        return 0
+
+    if args.command == 'section':
+        section = get_section(args.section_number)
+        if section is None:
+            logger.error(f"Section {args.section_number} not found")
+            return 1
+        print(f"{section['section_number']} {section['title']}\n")
+        print(section['raw_text'])
+        return 0
+
+    for result in search_sections(args.query, args.limit, args.chapters):
+        print(f"{result['section_number']:>7}  {result['score']:7.3f}  {result['title']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Network screening of crash locations.
+Groups crashes by intersection node and by sliding route milepoint windows,
+totals crashes, K+A crashes and EPDO per location and per year, and writes
+the top-ranked locations as the HSIP candidate table.
+"""
+
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from crash_aggregates import epdo_scores, severity_codes
+
+logger = logging.getLogger(__name__)
+
+# Output configuration
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SCREENING_FILENAME = "network_screening.csv"
+
+# Number of intersections and of segments kept in the ranked table
+TOP_N = 50
+
+# Crashes farther than this from their node are not counted at the intersection
+NODE_RADIUS_FT = 250.0
+
+# Sliding segment windows: WINDOW_LENGTH_MI long, starting every WINDOW_STEP_MI
+# (the length must be a whole number of steps)
+WINDOW_LENGTH_MI = 0.3
+WINDOW_STEP_MI = 0.1
+
+# Measures totalled per location; locations are ranked by EPDO, then K+A crashes,
+# then total crashes
+MEASURE_COLUMNS = ['crashes', 'ka', 'epdo']
+RANK_COLUMNS = ['epdo', 'ka', 'crashes']
+
+# Decimal places kept for coordinates and milepoints in the table
+COORD_PRECISION = 6
+MP_PRECISION = 2
+
+
+def _node_ids(nodes: pd.Series) -> pd.Series:
+    """Node ids as integers when every node is numeric, otherwise as stripped strings."""
+    numbers = pd.to_numeric(nodes, errors='coerce')
+    if numbers.notna().sum() == nodes.notna().sum() and (numbers.dropna() % 1 == 0).all():
+        return numbers.astype('Int64')
+    return nodes.astype('string').str.strip().replace('', pd.NA)
+
+
+def crash_measures(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-crash year, K+A flag, EPDO weight and coordinates used by the screening."""
+    severity = severity_codes(df['Crash Severity']) if 'Crash Severity' in df.columns \
+        else pd.Series(pd.NA, index=df.index, dtype='string')
+    return pd.DataFrame({
+        'year': df['Crash Year'].astype('Int16') if 'Crash Year' in df.columns else pd.NA,
+        'crashes': 1,
+        'ka': severity.isin(['K', 'A']).to_numpy(dtype=np.int64),
+        'epdo': epdo_scores(severity),
+        'lon': df['x'].to_numpy(dtype=float, na_value=np.nan) if 'x' in df.columns else np.nan,
+        'lat': df['y'].to_numpy(dtype=float, na_value=np.nan) if 'y' in df.columns else np.nan,
+    }, index=df.index)
+
+
+def intersection_crashes(df: pd.DataFrame) -> pd.DataFrame:
+    """Crashes with a node, within NODE_RADIUS_FT of it when the offset is known."""
+    if 'Node' not in df.columns:
+        return crash_measures(df.iloc[:0]).assign(node=pd.Series(dtype='Int64'))
+
+    crashes = crash_measures(df).assign(node=_node_ids(df['Node']))
+    keep = crashes['node'].notna()
+    if 'Node Offset (ft)' in df.columns:
+        offset = pd.to_numeric(df['Node Offset (ft)'], errors='coerce').abs()
+        keep &= offset.isna() | (offset <= NODE_RADIUS_FT)
+    return crashes[keep.to_numpy(dtype=bool)]
+
+
+def segment_crashes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Assign crashes to every sliding window on their route that covers them.
+    Milepoints are binned into WINDOW_STEP_MI steps; window k covers steps
+    k .. k + n - 1 (n = length / step), so each crash is repeated once per
+    window instead of scanning windows one by one.
+    """
+    if 'RTE Name' not in df.columns or 'RNS MP' not in df.columns:
+        return crash_measures(df.iloc[:0]).assign(route=pd.Series(dtype='string'), window=pd.Series(dtype='int64'))
+
+    route = df['RTE Name'].astype('string').str.strip().replace('', pd.NA)
+    mp = pd.to_numeric(df['RNS MP'], errors='coerce')
+    keep = (route.notna() & mp.notna() & (mp >= 0)).to_numpy(dtype=bool)
+
+    crashes = crash_measures(df)[keep].assign(route=route[keep])
+    # The small epsilon keeps milepoints on a step boundary from rounding into the step below
+    steps = np.floor(mp[keep].to_numpy(dtype=float) / WINDOW_STEP_MI + 1e-9).astype(np.int64)
+    windows_per_crash = int(round(WINDOW_LENGTH_MI / WINDOW_STEP_MI))
+
+    crashes = crashes.iloc[np.repeat(np.arange(len(crashes)), windows_per_crash)]
+    offsets = np.tile(np.arange(windows_per_crash), len(steps))
+    window = np.repeat(steps, windows_per_crash) - offsets
+    crashes = crashes.assign(window=window)
+    return crashes[window >= 0]
+
+
+def summarize_locations(crashes: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """
+    Total crashes, K+A and EPDO per location, with per-year columns
+    (e.g. 'crashes_2023') and the centroid of the crash coordinates.
+    Rows are ranked by RANK_COLUMNS.
+    """
+    grouped = crashes.groupby(keys, sort=False)
+    table = grouped[MEASURE_COLUMNS].sum()
+    table['lon'] = grouped['lon'].mean()
+    table['lat'] = grouped['lat'].mean()
+
+    per_year = crashes.dropna(subset=['year']).groupby(keys + ['year'], sort=False)[MEASURE_COLUMNS].sum()
+    if not per_year.empty:
+        per_year = per_year.unstack('year', fill_value=0).sort_index(axis=1, level='year')
+        per_year.columns = [f"{measure}_{int(year)}" for measure, year in per_year.columns]
+        table = table.join(per_year).fillna({col: 0 for col in per_year.columns})
+        table[per_year.columns] = table[per_year.columns].astype(np.int64)
+
+    table = table.reset_index()
+    return table.sort_values(RANK_COLUMNS + keys, ascending=[False] * len(RANK_COLUMNS) + [True] * len(keys),
+                             ignore_index=True)
+
+
+def screen_intersections(df: pd.DataFrame) -> pd.DataFrame:
+    """Rank every node by its crashes."""
+    return summarize_locations(intersection_crashes(df), ['node'])
+
+
+def screen_segments(df: pd.DataFrame) -> pd.DataFrame:
+    """Rank every route window by its crashes, with its milepoint range."""
+    table = summarize_locations(segment_crashes(df), ['route', 'window'])
+    table.insert(2, 'from_mp', (table['window'] * WINDOW_STEP_MI).round(MP_PRECISION))
+    table.insert(3, 'to_mp', (table['window'] * WINDOW_STEP_MI + WINDOW_LENGTH_MI).round(MP_PRECISION))
+    return table
+
+
+def top_segments(segments: pd.DataFrame, top_n: int = TOP_N) -> pd.DataFrame:
+    """
+    Take the top_n ranked windows, skipping windows that overlap a
+    higher-ranked window on the same route (otherwise one hot spot fills
+    several rows of the table).
+    """
+    windows_per_crash = int(round(WINDOW_LENGTH_MI / WINDOW_STEP_MI))
+    picked = {}
+    rows = []
+    for row, (route, window) in enumerate(zip(segments['route'], segments['window'])):
+        route_windows = picked.setdefault(route, [])
+        if any(abs(window - other) < windows_per_crash for other in route_windows):
+            continue
+        route_windows.append(window)
+        rows.append(row)
+        if len(rows) == top_n:
+            break
+    return segments.iloc[rows]
+
+
+def build_screening_table(df: pd.DataFrame, top_n: int = TOP_N) -> pd.DataFrame:
+    """Top-ranked intersections and segments as one table, ranked within each location type."""
+    intersections = screen_intersections(df).head(top_n)
+    intersections.insert(0, 'location_type', 'intersection')
+    segments = top_segments(screen_segments(df), top_n).drop(columns=['window'])
+    segments.insert(0, 'location_type', 'segment')
+
+    table = pd.concat([intersections, segments], ignore_index=True)
+    table.insert(1, 'rank', table.groupby('location_type').cumcount() + 1)
+    if pd.api.types.is_float_dtype(table['node']):
+        # Segments have no node, which turns integer node ids into floats in the concat
+        table['node'] = table['node'].astype('Int64')
+
+    year_columns = sorted((col for col in table.columns if col.rsplit('_', 1)[-1].isdigit()),
+                          key=lambda col: (MEASURE_COLUMNS.index(col.rsplit('_', 1)[0]), col))
+    table[year_columns] = table[year_columns].fillna(0).astype(np.int64)
+    table['lon'] = table['lon'].round(COORD_PRECISION)
+    table['lat'] = table['lat'].round(COORD_PRECISION)
+    columns = ['location_type', 'rank', 'node', 'route', 'from_mp', 'to_mp'] + MEASURE_COLUMNS + year_columns
+    return table.reindex(columns=columns + ['lon', 'lat'])
+
+
+def write_network_screening(df: pd.DataFrame, output_dir: str = None) -> str:
+    """Screen the crash network and write the ranked table as CSV, returning the path."""
+    path = os.path.join(output_dir or OUTPUT_DIR, SCREENING_FILENAME)
+    table = build_screening_table(df)
+
+    tmp_path = path + ".tmp"
+    table.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+    counts = table['location_type'].value_counts()
+    logger.info(f"Saved network screening of {counts.get('intersection', 0)} intersections and "
+                f"{counts.get('segment', 0)} segments to {path}")
+    return path
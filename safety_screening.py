@@ -0,0 +1,241 @@
+"""
+Empirical Bayes safety screening for HSIP/SS4A applications.
+Predicts crashes at every screened intersection and route segment from a
+Safety Performance Function (SPF) for its Facility Type / Functional Class
+reference group, then blends prediction and observation with the Empirical
+Bayes weight to rank sites by potential for safety improvement (PSI).
+
+The crash data carries no traffic volumes, so an SPF here is a reference
+group's mean crash frequency per site-year plus its negative binomial
+overdispersion. Groups are fitted from the crash data by the method of
+moments unless calibrated parameters are passed in. Sites come from the
+crash data, so sites without crashes are not part of the reference groups.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from network_screening import (
+    MP_PRECISION, WINDOW_LENGTH_MI, WINDOW_STEP_MI, intersection_crashes, segment_crashes,
+)
+
+logger = logging.getLogger(__name__)
+
+# Output configuration
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SCREENING_FILENAME = "safety_screening.csv"
+PARAMETERS_FILENAME = "spf_parameters.json"
+
+# Site attributes defining the SPF reference groups (the most common value at each site)
+GROUP_COLUMNS = {'functional_class': 'Functional Class', 'facility_type': 'Facility Type'}
+UNKNOWN_GROUP = 'Unknown'
+
+# Groups with fewer sites use the pooled parameters of their site type, stored under
+# (site_type, ALL_GROUPS, ALL_GROUPS)
+MIN_REFERENCE_SITES = 10
+ALL_GROUPS = '*'
+
+# Overdispersion used when a site type's pooled fit shows none (k <= 0), e.g. a short
+# study period with few crashes per site; a k of 0 would give every site an Empirical
+# Bayes weight of 1 and a PSI of 0
+DEFAULT_OVERDISPERSION = 0.5
+
+# Calibrated SPF parameters that replace fitted ones, keyed by
+# (site_type, functional_class, facility_type):
+# {'annual_crashes': predicted crashes per site-year, 'overdispersion': k}
+SPF_PARAMETERS = {}
+
+# Decimal places kept for predicted and expected crashes
+CRASH_PRECISION = 3
+
+
+def _modal_values(crashes: pd.DataFrame, keys: list, values: pd.Series) -> pd.Series:
+    """Most common non-missing value per site (ties go to the first value in sort order)."""
+    counts = crashes[keys].assign(value=values.to_numpy()).dropna(subset=['value'])
+    counts = counts.groupby(keys + ['value'], sort=True).size().rename('n').reset_index()
+    counts = counts.sort_values('n', ascending=False, kind='stable').drop_duplicates(keys)
+    return counts.set_index(keys)['value']
+
+
+def _site_table(crashes: pd.DataFrame, df: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """Crash and K+A totals per site with its reference group attributes."""
+    sites = crashes.groupby(keys, sort=True)[['crashes', 'ka']].sum()
+    for name, column in GROUP_COLUMNS.items():
+        if column in df.columns:
+            values = df[column].astype('string').str.strip().replace('', pd.NA).reindex(crashes.index)
+            sites[name] = _modal_values(crashes, keys, values)
+        else:
+            sites[name] = pd.NA
+        sites[name] = sites[name].fillna(UNKNOWN_GROUP).astype(str)
+    return sites.reset_index()
+
+
+def build_sites(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Screening sites from the crash frame: every intersection node and every
+    sliding route window from network_screening, with crash and K+A totals.
+    """
+    intersections = _site_table(intersection_crashes(df), df, ['node'])
+    intersections.insert(0, 'site_type', 'intersection')
+
+    segments = _site_table(segment_crashes(df), df, ['route', 'window'])
+    segments.insert(0, 'site_type', 'segment')
+    segments.insert(3, 'from_mp', (segments['window'] * WINDOW_STEP_MI).round(MP_PRECISION))
+    segments.insert(4, 'to_mp', (segments['window'] * WINDOW_STEP_MI + WINDOW_LENGTH_MI).round(MP_PRECISION))
+
+    sites = pd.concat([intersections, segments], ignore_index=True)
+    if pd.api.types.is_float_dtype(sites['node']):
+        sites['node'] = sites['node'].astype('Int64')
+    return sites
+
+
+def _moment_parameters(totals, years: int) -> pd.DataFrame:
+    """
+    Mean crashes per site-year and negative binomial overdispersion of site
+    totals. The overdispersion is left as fitted, including values <= 0 or
+    missing when the totals vary no more than a Poisson count would.
+    """
+    mean = totals.mean()
+    var = totals.var(ddof=1)
+    overdispersion = ((var - mean) / (mean * mean)).where(mean > 0)
+    return pd.DataFrame({
+        'annual_crashes': mean / years,
+        'overdispersion': overdispersion,
+        'sites': totals.size(),
+    })
+
+
+def fit_spf(sites: pd.DataFrame, years: int, measure: str = 'crashes') -> dict:
+    """
+    Fit SPF parameters per (site_type, functional_class, facility_type) group
+    from the site totals of `measure`, plus the pooled parameters of each
+    site type. Overlapping sliding windows are left out of the segment fit,
+    so every crash is counted once. A fitted overdispersion <= 0 is replaced
+    and logged; 'overdispersion_source' records whether each k was fitted or
+    taken from the pooled fit or DEFAULT_OVERDISPERSION.
+    """
+    windows_per_crash = int(round(WINDOW_LENGTH_MI / WINDOW_STEP_MI))
+    reference = sites[(sites['site_type'] != 'segment') | (sites['window'] % windows_per_crash == 0)]
+
+    grouped = _moment_parameters(
+        reference.groupby(['site_type', *GROUP_COLUMNS], sort=True)[measure], years)
+    grouped = grouped[grouped['sites'] >= MIN_REFERENCE_SITES]
+    pooled = _moment_parameters(reference.groupby('site_type', sort=True)[measure], years)
+
+    # A fitted k <= 0 falls back to the pooled k of the site type, then to DEFAULT_OVERDISPERSION
+    pooled['overdispersion_source'] = 'fitted'
+    degenerate = ~(pooled['overdispersion'] > 0)
+    for site_type in pooled.index[degenerate]:
+        logger.warning(f"Pooled {site_type} SPF fit has overdispersion <= 0 "
+                       f"({pooled.at[site_type, 'sites']} sites), using {DEFAULT_OVERDISPERSION}")
+    pooled.loc[degenerate, 'overdispersion'] = DEFAULT_OVERDISPERSION
+    pooled.loc[degenerate, 'overdispersion_source'] = 'default'
+
+    grouped['overdispersion_source'] = 'fitted'
+    degenerate = ~(grouped['overdispersion'] > 0)
+    if degenerate.any():
+        logger.warning(f"{degenerate.sum()} of {len(grouped)} SPF reference groups have overdispersion <= 0, "
+                       f"using the pooled overdispersion of their site type")
+        site_types = grouped.index[degenerate].get_level_values('site_type')
+        grouped.loc[degenerate, 'overdispersion'] = pooled['overdispersion'].reindex(site_types).to_numpy()
+        grouped.loc[degenerate, 'overdispersion_source'] = 'pooled'
+
+    pooled.index = pd.MultiIndex.from_tuples([(site_type, ALL_GROUPS, ALL_GROUPS) for site_type in pooled.index])
+    parameters = pd.concat([grouped, pooled])
+    return {
+        key: {'annual_crashes': float(row.annual_crashes), 'overdispersion': float(row.overdispersion),
+              'overdispersion_source': row.overdispersion_source, 'sites': int(row.sites)}
+        for key, row in zip(parameters.index, parameters.itertuples())
+    }
+
+
+def empirical_bayes(observed: np.ndarray, predicted: np.ndarray, overdispersion: np.ndarray) -> tuple:
+    """
+    Empirical Bayes expected crashes for arrays of sites:
+    w = 1 / (1 + k * predicted), expected = w * predicted + (1 - w) * observed.
+    Returns (expected, weight).
+    """
+    weight = 1.0 / (1.0 + overdispersion * predicted)
+    return weight * predicted + (1.0 - weight) * observed, weight
+
+
+def study_years(df: pd.DataFrame) -> int:
+    """Length of the study period in years, from the first to the last Crash Year (at least 1)."""
+    if 'Crash Year' not in df.columns:
+        return 1
+    crash_years = pd.to_numeric(df['Crash Year'], errors='coerce').dropna()
+    if crash_years.empty:
+        return 1
+    return int(crash_years.max() - crash_years.min()) + 1
+
+
+def screen_sites(df: pd.DataFrame, parameters: dict = None, measure: str = 'crashes',
+                 sites: pd.DataFrame = None) -> tuple:
+    """
+    Rank every site by potential for safety improvement (EB expected minus
+    SPF predicted crashes over the study period). `parameters` replaces
+    fitted SPF parameters for the groups it names (defaults to
+    SPF_PARAMETERS); groups without parameters fall back to the pooled
+    parameters of their site type. Pass `sites` from build_sites() to try
+    parameters again without rebuilding them.
+    Returns (ranked sites, SPF parameters used).
+    """
+    if sites is None:
+        sites = build_sites(df)
+    years = study_years(df)
+
+    spf = fit_spf(sites, years, measure)
+    spf.update(SPF_PARAMETERS if parameters is None else parameters)
+
+    table = pd.DataFrame.from_dict(spf, orient='index')[['annual_crashes', 'overdispersion']]
+    table.index = pd.MultiIndex.from_tuples(table.index, names=['site_type', *GROUP_COLUMNS])
+    keys = ['site_type', *GROUP_COLUMNS]
+    matched = sites[keys].join(table, on=keys)
+    pooled = sites[['site_type']].join(table.xs((ALL_GROUPS, ALL_GROUPS), level=list(GROUP_COLUMNS)),
+                                       on='site_type')
+    annual = matched['annual_crashes'].fillna(pooled['annual_crashes']).to_numpy(dtype=float)
+    overdispersion = matched['overdispersion'].fillna(pooled['overdispersion']).to_numpy(dtype=float)
+
+    observed = sites[measure].to_numpy(dtype=float)
+    predicted = annual * years
+    expected, weight = empirical_bayes(observed, predicted, overdispersion)
+
+    ranked = sites.assign(
+        observed=sites[measure],
+        predicted=predicted.round(CRASH_PRECISION),
+        expected=expected.round(CRASH_PRECISION),
+        eb_weight=weight.round(CRASH_PRECISION),
+        psi=(expected - predicted).round(CRASH_PRECISION),
+    )
+    ranked = ranked.sort_values(['psi', 'observed'], ascending=False, kind='stable', ignore_index=True)
+    ranked.insert(1, 'rank', ranked.groupby('site_type').cumcount() + 1)
+    return ranked.drop(columns=['window']), spf
+
+
+def write_safety_screening(df: pd.DataFrame, output_dir: str = None) -> str:
+    """Screen every site, writing the ranked sites as CSV and the SPF parameters as JSON."""
+    output_dir = output_dir or OUTPUT_DIR
+    ranked, spf = screen_sites(df)
+
+    path = os.path.join(output_dir, SCREENING_FILENAME)
+    tmp_path = path + ".tmp"
+    ranked.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+    parameters = [
+        {'site_type': site_type, 'functional_class': functional_class, 'facility_type': facility_type, **values}
+        for (site_type, functional_class, facility_type), values in sorted(spf.items())
+    ]
+    parameters_path = os.path.join(output_dir, PARAMETERS_FILENAME)
+    tmp_path = parameters_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(parameters, f, indent=2)
+    os.replace(tmp_path, parameters_path)
+
+    logger.info(f"Saved Empirical Bayes screening of {len(ranked)} sites to {path} "
+                f"({len(spf)} SPF reference groups)")
+    return path
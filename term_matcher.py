@@ -0,0 +1,92 @@
+"""
+Multi-term matching for the grant filters.
+Compiles a list of literal terms once into an Aho-Corasick automaton and
+finds every term that occurs in a piece of text in a single scan,
+including overlapping occurrences and terms that are prefixes of others.
+"""
+
+from collections import deque
+
+
+class TermMatcher:
+    """
+    Match a fixed set of literal terms against text in one pass.
+
+    The terms are compiled into an Aho-Corasick automaton whose failure
+    links are folded into a full transition table, so scanning costs one
+    dict lookup per character no matter how many terms there are. Each state
+    carries every term ending there (its own plus those reached through
+    failure links), so overlapping terms and terms that are prefixes or
+    suffixes of a longer term are all reported.
+    """
+
+    def __init__(self, terms, ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        self.terms = list(dict.fromkeys(terms))
+        self._canonical = {self._fold(term): term for term in self.terms if term}
+        self._transitions, self._outputs = self._build(self._canonical)
+
+    def _fold(self, text: str) -> str:
+        return text.lower() if self.ignore_case else text
+
+    @staticmethod
+    def _build(terms) -> tuple:
+        """Build the transition table and per-state outputs of the automaton for `terms`."""
+        # Trie of the terms; state 0 is the root
+        transitions = [{}]
+        outputs = [()]
+        for term in terms:
+            state = 0
+            for char in term:
+                if char not in transitions[state]:
+                    transitions.append({})
+                    outputs.append(())
+                    transitions[state][char] = len(transitions) - 1
+                state = transitions[state][char]
+            outputs[state] = (term,)
+
+        # Breadth-first over the trie: a state's failure link is the longest proper
+        # suffix of its path that is also a trie path, and it inherits that state's
+        # outputs. Missing transitions are then copied from the failure state, whose
+        # table is already complete because it is shallower.
+        failure = [0] * len(transitions)
+        queue = deque(transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[failure[state]]
+            for char, child in transitions[state].items():
+                if state != 0:
+                    failure[child] = transitions[failure[state]].get(char, 0)
+                queue.append(child)
+            if state != 0:
+                for char, target in transitions[failure[state]].items():
+                    transitions[state].setdefault(char, target)
+        return transitions, outputs
+
+    def _scan(self, text: str):
+        """Yield the terms ending at each position of the folded text, in order."""
+        transitions = self._transitions
+        outputs = self._outputs
+        state = 0
+        for char in self._fold(text):
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                yield outputs[state]
+
+    def search(self, text) -> bool:
+        """Check whether any term occurs in text. Non-string values never match."""
+        if not isinstance(text, str) or not text:
+            return False
+        return next(self._scan(text), None) is not None
+
+    def find_all(self, text) -> list:
+        """Return every distinct term occurring in text, in the order their first occurrences end."""
+        if not isinstance(text, str) or not text:
+            return []
+
+        found = {}
+        for terms in self._scan(text):
+            # Terms ending at the same position come longest first
+            for term in terms:
+                found.setdefault(term, None)
+        return [self._canonical[term] for term in found]